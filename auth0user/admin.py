@@ -0,0 +1,78 @@
+from django.contrib import admin, messages
+from django.http import StreamingHttpResponse
+from django.utils.translation import ugettext_lazy as _
+
+from . import exports
+from .utils import RateLimiter
+
+
+def export_response(queryset, format):
+    # the rows are streamed after the middleware clears the current site, so keep its database
+    queryset = queryset.using(queryset.db)
+    response = StreamingHttpResponse(
+        exports.export_lines(queryset, format, workers=4),
+        content_type=exports.CONTENT_TYPES[format])
+    response['Content-Disposition'] = 'attachment; filename="users.%s"' % format
+    return response
+
+
+def export_csv(modeladmin, request, queryset):
+    return export_response(queryset, exports.CSV)
+export_csv.short_description = _('Export selected users as CSV')
+
+
+def export_ndjson(modeladmin, request, queryset):
+    return export_response(queryset, exports.NDJSON)
+export_ndjson.short_description = _('Export selected users as NDJSON')
+
+
+def set_active(modeladmin, request, queryset, active):
+    auth0_ids = queryset.order_by().values_list('auth0_id', flat=True).distinct()
+    results = queryset.model._default_manager.set_active_many(
+        list(auth0_ids), active, workers=4, limiter=RateLimiter(5))
+    failed = [result for result in results if result.error]
+    modeladmin.message_user(request, _('Updated %(people)s people on %(rows)s site users.') % {
+        'people': len(results) - len(failed), 'rows': sum(result.rows for result in results)})
+    for result in failed:
+        modeladmin.message_user(request, _('Auth0 failed for %(auth0_id)s: %(error)s') % {
+            'auth0_id': result.auth0_id, 'error': result.error}, messages.ERROR)
+
+
+def activate_users(modeladmin, request, queryset):
+    set_active(modeladmin, request, queryset, True)
+activate_users.short_description = _('Activate selected people on all sites and Auth0')
+
+
+def deactivate_users(modeladmin, request, queryset):
+    set_active(modeladmin, request, queryset, False)
+deactivate_users.short_description = _('Deactivate selected people on all sites and Auth0')
+
+
+class SiteUserAdmin(admin.ModelAdmin):
+
+    """
+    Admin for a concrete SiteUser model, searching and ordering on the local name columns.
+
+    Register it against your own user model::
+
+        admin.site.register(User, SiteUserAdmin)
+    """
+
+    fieldsets = (
+        (None, {'fields': ('email', 'auth0_id', 'site')}),
+        (_('Personal info'), {'fields': ('given_name', 'family_name')}),
+        (_('Permissions'), {'fields': ('is_active', 'is_staff', 'is_superuser',
+                                       'groups', 'user_permissions')}),
+        (_('Important dates'), {'fields': ('last_login', 'date_joined')}),
+    )
+    readonly_fields = ('email', 'auth0_id', 'given_name', 'family_name', 'last_login')
+    list_display = ('email', 'given_name', 'family_name', 'site', 'is_staff', 'is_active')
+    list_filter = ('site', 'is_staff', 'is_superuser', 'is_active', 'groups')
+    search_fields = ('email', 'given_name', 'family_name', 'auth0_id')
+    ordering = ('family_name', 'given_name', 'email')
+    filter_horizontal = ('groups', 'user_permissions')
+    actions = (export_csv, export_ndjson, activate_users, deactivate_users)
+
+    def has_add_permission(self, request):
+        # users are created with createsuperuser, createsiteusers or the manager
+        return False
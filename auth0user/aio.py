@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Async access to profiles, user creation and the Auth0 client, on Python 3.5 or later.
+
+Django's ORM and cache and the Auth0 client are blocking, so each call runs on a dedicated
+pool of ``settings.AUTH0_ASYNC_WORKERS`` threads (default 10). At most that many calls run at
+once, the rest wait for a free worker without blocking the event loop.
+
+Calls see the current site, identity map and replica pinning of the calling thread, and close
+their database connections like a request does, so pool threads don't hold stale ones.
+"""
+import asyncio
+import functools
+
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections
+
+from . import routers, sites
+from .clients import get_client
+from .models import Profile, share_identity_map
+from .utils import ASYNC_WORKERS_DEFAULT, get_executor
+
+
+def in_context(func):
+    """
+    Wrap ``func`` to run on a pool thread with the context of the calling thread.
+
+    The wrapper returns the result and whether the call wrote users, so the caller can keep
+    reading them from the primary database.
+    """
+    site_id = sites.get_current_site_id()
+    pinned = routers.is_pinned()
+    func = share_identity_map(func)
+
+    def wrapper(*args, **kwargs):
+        close_old_connections()
+        sites.set_current_site_id(site_id)
+        if pinned:
+            routers.pin()
+        try:
+            return func(*args, **kwargs), routers.has_written()
+        finally:
+            routers.unpin()
+            sites.clear_current_site_id()
+            close_old_connections()
+    return wrapper
+
+
+async def run_async(func, *args, **kwargs):
+    """
+    Await a blocking call on the async pool, so slow Auth0 calls don't block the loop.
+    """
+    loop = asyncio.get_event_loop()
+    result, written = await loop.run_in_executor(
+        get_executor('AUTH0_ASYNC_WORKERS', ASYNC_WORKERS_DEFAULT),
+        functools.partial(in_context(func), *args, **kwargs))
+    if written:
+        routers.pin(written=True)
+    return result
+
+
+async def get_profile(auth0_id=None, fields=None):
+    """
+    Async ``Profile.get``.
+    """
+    return await run_async(Profile.get, auth0_id, fields)
+
+
+async def get_profiles(auth0_ids, fields=None, workers=1, limiter=None, stagger=0):
+    """
+    Async ``Profile.get_many``.
+    """
+    return await run_async(Profile.get_many, auth0_ids, fields, workers, limiter, stagger)
+
+
+async def save_profile(profile):
+    await run_async(profile.save)
+
+
+async def get_user_profile(user):
+    """
+    Async ``user.profile``.
+    """
+    try:
+        return user._profile
+    except AttributeError:
+        pass
+    user._profile = await get_profile(user.auth0_id, fields=user.PROFILE_FIELDS)
+    return user._profile
+
+
+async def create_user(email, password=None, **extra_fields):
+    """
+    Async ``User.objects.create_user``.
+    """
+    return await run_async(
+        get_user_model()._default_manager.create_user, email, password, **extra_fields)
+
+
+async def create_superuser(email, password, **extra_fields):
+    """
+    Async ``User.objects.create_superuser``.
+    """
+    return await run_async(
+        get_user_model()._default_manager.create_superuser, email, password, **extra_fields)
+
+
+async def exchange_code(code, redirect_uri):
+    return await run_async(get_client().exchange_code, code, redirect_uri)
+
+
+async def get_userinfo(access_token):
+    return await run_async(get_client().get_userinfo, access_token)
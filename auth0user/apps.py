@@ -1,6 +1,32 @@
 from django.apps import AppConfig
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import post_delete, post_save
 
 
 class Auth0UserConfig(AppConfig):
     name = 'auth0user'
     verbose_name = "Auth0 User"
+
+    def ready(self):
+        from django.contrib.auth import get_user_model
+        from django.contrib.auth.models import update_last_login
+        from django.contrib.sites.models import Site
+        from . import backends, claims, receivers, sites
+        from .models import SiteUser
+        from .signals import profile_saved
+        user_logged_in.disconnect(update_last_login)
+        user_logged_in.disconnect(dispatch_uid='update_last_login')
+        # taking the dispatch_uid also stops later Django versions connecting theirs
+        user_logged_in.connect(receivers.update_last_login, dispatch_uid='update_last_login')
+        user_logged_in.connect(receivers.sync_names, dispatch_uid='auth0user.sync_names')
+        user_logged_in.connect(
+            receivers.store_login_claims, dispatch_uid='auth0user.store_login_claims')
+        profile_saved.connect(claims.profile_saved, dispatch_uid='auth0user.claims')
+        post_save.connect(sites.clear_host_cache, sender=Site, dispatch_uid='auth0user.sites')
+        post_delete.connect(sites.clear_host_cache, sender=Site, dispatch_uid='auth0user.sites')
+        User = get_user_model()
+        if issubclass(User, SiteUser):
+            post_save.connect(
+                backends.user_changed, sender=User, dispatch_uid='auth0user.backends')
+            post_delete.connect(
+                backends.user_changed, sender=User, dispatch_uid='auth0user.backends')
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Stateless authentication of API requests with Auth0 access tokens.
+
+Tokens are verified locally against the tenant's cached signing keys and their ``sub`` is
+mapped to the site user of the current site through a short-lived cache, so an authenticated
+API call needs no session, no network and, for cached users, no database query.
+"""
+import json
+import logging
+import time
+
+import requests
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+
+from . import sites
+
+try:
+    import jwt
+    from jwt.algorithms import RSAAlgorithm
+    from jwt.exceptions import InvalidKeyError
+except ImportError:  # pragma: no cover
+    jwt = None
+
+logger = logging.getLogger(__name__)
+
+JWKS_CACHE_DEFAULT = 3600
+# seconds between fetching the keys again for an unknown key id, or after a failed fetch
+JWKS_REFRESH_MIN = 60
+TOKEN_USER_CACHE_DEFAULT = 60
+TOKEN_LEEWAY_DEFAULT = 10
+
+# jwks url to (key id to key, time to fetch again, time to fetch again for an unknown key id)
+_jwks = {}
+
+
+def get_jwks_url():
+    return getattr(
+        settings, 'AUTH0_JWKS_URL',
+        'https://%s/.well-known/jwks.json' % settings.AUTH0_DOMAIN)
+
+
+def fetch_jwks(url):
+    response = requests.get(url, timeout=5)
+    response.raise_for_status()
+    return response.json()
+
+
+def get_signing_keys(refresh=False):
+    """
+    Return a dict of key id to public key of the tenant.
+
+    The key set is kept in the process and in the cache for ``settings.AUTH0_JWKS_CACHE``
+    seconds, and fetched again for an unknown key id at most every ``JWKS_REFRESH_MIN``.
+    When Auth0 can't be reached the last good key set is kept and fetched again after
+    ``JWKS_REFRESH_MIN`` seconds.
+    """
+    url = get_jwks_url()
+    keys, expires, refresh_after = _jwks.get(url, ({}, 0, 0))
+    timeout = getattr(settings, 'AUTH0_JWKS_CACHE', JWKS_CACHE_DEFAULT)
+    now = time.time()
+    if now < (refresh_after if refresh else expires):
+        return keys
+    cache_key = 'auth0user.jwks.%s' % url
+    cached = None if refresh else cache.get(cache_key)
+    if cached is None:
+        try:
+            cached = fetch_jwks(url)
+        except (requests.RequestException, ValueError):
+            logger.error("Could not fetch the Auth0 signing keys", exc_info=True)
+            _jwks[url] = (keys, now + JWKS_REFRESH_MIN, now + JWKS_REFRESH_MIN)
+            return keys
+        cache.set(cache_key, cached, timeout)
+    keys = {}
+    for key in cached.get('keys', []):
+        if key.get('kty') != 'RSA' or 'kid' not in key:
+            continue
+        # one malformed key is skipped rather than failing every token
+        try:
+            keys[key['kid']] = RSAAlgorithm.from_jwk(json.dumps(key))
+        except (InvalidKeyError, KeyError, TypeError, ValueError):
+            logger.warning("Skipped the malformed Auth0 signing key %r", key['kid'], exc_info=True)
+    _jwks[url] = (keys, now + timeout, now + JWKS_REFRESH_MIN)
+    return keys
+
+
+def verify_token(token):
+    """
+    Return the claims of a valid access token, or raise ``jwt.InvalidTokenError``.
+
+    The audience is ``settings.AUTH0_API_AUDIENCE``, defaulting to the client id, and the
+    issuer is the tenant of ``settings.AUTH0_DOMAIN``.
+    """
+    if jwt is None:
+        raise ImproperlyConfigured(
+            'Bearer token authentication requires PyJWT, pip install django-auth0user[jwt]')
+    kid = jwt.get_unverified_header(token).get('kid')
+    key = get_signing_keys().get(kid) or get_signing_keys(refresh=True).get(kid)
+    if key is None:
+        raise jwt.InvalidTokenError('Unknown signing key %r' % kid)
+    return jwt.decode(
+        token, key,
+        algorithms=getattr(settings, 'AUTH0_TOKEN_ALGORITHMS', ['RS256']),
+        audience=getattr(settings, 'AUTH0_API_AUDIENCE', settings.AUTH0_CLIENT_ID),
+        issuer='https://%s/' % settings.AUTH0_DOMAIN,
+        leeway=getattr(settings, 'AUTH0_TOKEN_LEEWAY', TOKEN_LEEWAY_DEFAULT))
+
+
+def _get_token_user_key(auth0_id, site_id):
+    return 'auth0user.tokenuser.%s.%s' % (site_id, auth0_id)
+
+
+def get_token_user(auth0_id, site_id=None):
+    """
+    Return the site user of ``auth0_id`` on a site, defaulting to the current site, or None.
+
+    Users, and their absence, are cached for ``settings.AUTH0_TOKEN_USER_CACHE`` seconds.
+    """
+    site_id = site_id or sites.get_current_site_id()
+    key = _get_token_user_key(auth0_id, site_id)
+    user = cache.get(key)
+    if user is None:
+        UserModel = get_user_model()
+        try:
+            user = UserModel._default_manager.db_for_site(site_id).get(
+                auth0_id=auth0_id, site_id=site_id)
+        except UserModel.DoesNotExist:
+            user = False
+        cache.set(
+            key, user, getattr(settings, 'AUTH0_TOKEN_USER_CACHE', TOKEN_USER_CACHE_DEFAULT))
+    return user or None
+
+
+def invalidate_token_users(pairs):
+    """
+    Drop the cached token users of ``(auth0_id, site_id)`` pairs.
+    """
+    cache.delete_many([_get_token_user_key(auth0_id, site_id) for auth0_id, site_id in pairs])
+
+
+def user_changed(sender, instance, **kwargs):
+    invalidate_token_users([(instance.auth0_id, instance.site_id)])
+
+
+class Auth0TokenBackend(ModelBackend):
+
+    """
+    Authenticates the site user of the current site with an Auth0 access token.
+    """
+
+    def authenticate(self, request=None, token=None, **kwargs):
+        if token is None:
+            return None
+        if jwt is None:
+            logger.error("Bearer token authentication requires PyJWT")
+            return None
+        try:
+            claims = verify_token(token)
+        except jwt.InvalidTokenError:
+            return None
+        user = get_token_user(claims.get('sub'))
+        if user is not None and self.user_can_authenticate(user):
+            return user
+        return None
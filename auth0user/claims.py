@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+A small signed set of profile claims kept in the session, so rendering the current user's
+name needs no cache or Auth0 lookup.
+"""
+import threading
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core import signing
+
+CLAIMS_SESSION_KEY = '_auth0user_claims'
+CLAIMS_SALT = 'auth0user.claims'
+CLAIMS_VERSION = 1
+CLAIMS_MAX_AGE_DEFAULT = 3600
+
+# profiles saved during the current request by auth0 id
+_saved = threading.local()
+
+
+def make_claims(user, profile=None):
+    profile = profile or user.profile
+    return {
+        'v': CLAIMS_VERSION,
+        'uid': str(user.pk),
+        'sub': user.auth0_id,
+        'name': ('%s %s' % (profile.given_name, profile.family_name)).strip(),
+        'given_name': profile.given_name,
+        'family_name': profile.family_name,
+        'email': user.email,
+        'picture': getattr(profile, 'picture', ''),
+    }
+
+
+def store_claims(request, user, profile=None):
+    claims = make_claims(user, profile)
+    request.session[CLAIMS_SESSION_KEY] = signing.dumps(
+        claims, salt=CLAIMS_SALT, compress=True)
+    return claims
+
+
+def get_claims(request):
+    """
+    Return the claims of the logged in user, or an empty dict for anonymous users.
+
+    Claims are rebuilt from the profile when missing, older than
+    ``settings.AUTH0_CLAIMS_MAX_AGE`` seconds or from another user or version.
+    """
+    session = getattr(request, 'session', None)
+    if session is None or SESSION_KEY not in session:
+        return {}
+    value = session.get(CLAIMS_SESSION_KEY)
+    if value:
+        try:
+            claims = signing.loads(
+                value, salt=CLAIMS_SALT,
+                max_age=getattr(settings, 'AUTH0_CLAIMS_MAX_AGE', CLAIMS_MAX_AGE_DEFAULT))
+            if claims.get('v') == CLAIMS_VERSION and claims.get('uid') == str(session[SESSION_KEY]):
+                return claims
+        except signing.BadSignature:
+            pass
+    if request.user.is_authenticated():
+        return store_claims(request, request.user)
+    return {}
+
+
+def start_request():
+    _saved.profiles = {}
+
+
+def profile_saved(sender, profile, **kwargs):
+    profiles = getattr(_saved, 'profiles', None)
+    if profiles is not None:
+        profiles[profile.user_id] = profile
+
+
+def finish_request(request):
+    """
+    Refresh the claims if the logged in user's profile was saved during the request.
+    """
+    profiles = getattr(_saved, 'profiles', None)
+    _saved.profiles = None
+    user = getattr(request, 'user', None)
+    if profiles and user is not None and getattr(user, 'auth0_id', None) in profiles:
+        store_claims(request, user, profiles[user.auth0_id])
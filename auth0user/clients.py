@@ -0,0 +1,515 @@
+# -*- coding: utf-8 -*-
+"""
+Clients used by auth0user to talk to the Auth0 Management and Authentication APIs.
+
+The client is selected with ``settings.AUTH0_CLIENT`` which defaults to the network
+backed ``Auth0Client``. ``InMemoryClient`` keeps users in process and is intended for
+tests and offline development.
+"""
+import json
+import uuid
+from copy import deepcopy
+
+import requests
+
+from auth0plus.exceptions import Auth0Error, MultipleObjectsReturned, ObjectDoesNotExist
+from auth0plus.management import Auth0
+from auth0plus.settings import TIMEOUT
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from django.utils.six.moves.urllib.parse import quote
+
+
+DEFAULT_CLIENT = 'auth0user.clients.Auth0Client'
+
+_client = None
+
+
+def get_client():
+    """
+    Return the configured client instance, creating it on first use.
+    """
+    global _client
+    if _client is None:
+        client_class = import_string(getattr(settings, 'AUTH0_CLIENT', DEFAULT_CLIENT))
+        _client = client_class()
+    return _client
+
+
+@receiver(setting_changed)
+def reset_client(**kwargs):
+    global _client
+    if kwargs['setting'] in (
+            'AUTH0_CLIENT', 'AUTH0_DOMAIN', 'AUTH0_JWT', 'AUTH0_CONNECTION', 'AUTH0_DEADLINE'):
+        _client = None
+
+
+class ClientUsers(object):
+    """
+    Descriptor resolving to the users endpoint of the configured client at access time.
+    """
+
+    def __get__(self, instance, owner):
+        return get_client().users
+
+
+def _build_terms_query(field, values):
+    return u'%s:(%s)' % (field, ' OR '.join(u'"%s"' % value for value in values))
+
+
+class BaseClient(object):
+
+    users = None
+
+    # the number of ids or emails OR'd together in one user search
+    search_batch_size = 50
+
+    def get_users(self, user_ids, fields=None):
+        """
+        Return the users with any of the given ids in a single search.
+        """
+        kwargs = {'q': _build_terms_query('user_id', user_ids), 'per_page': len(user_ids)}
+        if fields:
+            kwargs['fields'] = ','.join(fields)
+        return list(self.users.query(**kwargs))
+
+    def get_users_by_email(self, emails):
+        """
+        Return the users with any of the given emails in a single search.
+        """
+        return list(self.users.query(
+            q=_build_terms_query('email', emails), per_page=len(emails)))
+
+    def get_imported_user_id(self, user_id):
+        """
+        Return the Auth0 id given to a user imported with ``user_id`` into a database connection.
+        """
+        return 'auth0|%s' % user_id
+
+    def import_users(self, users, upsert=False):
+        """
+        Start a bulk user import job for a list of user dicts and return the job dict.
+        """
+        raise NotImplementedError
+
+    def get_job(self, job_id):
+        """
+        Return the job dict, whose ``status`` is pending, processing, completed or failed.
+        """
+        raise NotImplementedError
+
+    def get_job_errors(self, job_id):
+        """
+        Return a list of ``{'user': ..., 'errors': [...]}`` dicts for users a job failed on.
+        """
+        raise NotImplementedError
+
+    def set_blocked(self, user_id, blocked):
+        """
+        Block or unblock a user from logging in to Auth0.
+        """
+        raise NotImplementedError
+
+    def exchange_code(self, code, redirect_uri):
+        """
+        Exchange an authorization code for the token response dict.
+        """
+        raise NotImplementedError
+
+    def get_userinfo(self, access_token):
+        """
+        Return the userinfo dict for an access token.
+        """
+        raise NotImplementedError
+
+
+class Auth0Client(BaseClient):
+
+    """
+    Client for a real Auth0 tenant, using auth0plus for the Management API.
+    """
+
+    def __init__(self):
+        self.domain = settings.AUTH0_DOMAIN
+        # a lone request can't be interrupted, so the deadline also bounds each request
+        deadline = getattr(settings, 'AUTH0_DEADLINE', None)
+        self.users = Auth0(
+            settings.AUTH0_DOMAIN,
+            settings.AUTH0_JWT,
+            client_id=settings.AUTH0_CLIENT_ID,
+            default_connection=settings.AUTH0_CONNECTION,
+            timeout=min(deadline, TIMEOUT) if deadline else TIMEOUT).users
+
+    def _get_url(self, *path):
+        return '/'.join((self.users._base_url,) + path)
+
+    def get_connection_id(self):
+        try:
+            return self._connection_id
+        except AttributeError:
+            pass
+        connections = self.users._client.get(
+            self._get_url('connections'),
+            {'name': settings.AUTH0_CONNECTION, 'fields': 'id'})
+        self._connection_id = connections[0]['id']
+        return self._connection_id
+
+    def import_users(self, users, upsert=False):
+        return self.users._client.file_post(
+            self._get_url('jobs', 'users-imports'),
+            data={'connection_id': self.get_connection_id(), 'upsert': json.dumps(upsert)},
+            files={'users': ('users.json', json.dumps(users), 'application/json')})
+
+    def get_job(self, job_id):
+        return self.users._client.get(self._get_url('jobs', job_id))[0]
+
+    def get_job_errors(self, job_id):
+        return self.users._client.get(self._get_url('jobs', job_id, 'errors'))
+
+    def set_blocked(self, user_id, blocked):
+        self.users._client.patch(
+            self._get_url('users', quote(user_id, safe='')), {'blocked': blocked})
+
+    def _process_response(self, response):
+        data = response.json() if response.text else {}
+        if response.status_code >= 400:
+            raise Auth0Error(
+                status_code=response.status_code,
+                error_code=data.get('error', data.get('errorCode', '')),
+                message=data.get('error_description', data.get('message', '')))
+        return data
+
+    def exchange_code(self, code, redirect_uri):
+        token_url = "https://{domain}/oauth/token".format(domain=self.domain)
+        token_payload = {
+            'client_id': settings.AUTH0_CLIENT_ID,
+            'client_secret': settings.AUTH0_CLIENT_SECRET,
+            'redirect_uri': redirect_uri,
+            'code': code,
+            'grant_type': 'authorization_code'
+        }
+        response = requests.post(
+            token_url, data=json.dumps(token_payload),
+            headers={'content-type': 'application/json'})
+        return self._process_response(response)
+
+    def get_userinfo(self, access_token):
+        user_url = "https://{domain}/userinfo".format(domain=self.domain)
+        response = requests.get(
+            user_url, headers={'Authorization': 'Bearer %s' % access_token})
+        return self._process_response(response)
+
+
+def _parse_query(q):
+    """
+    Parse the subset of lucene queries auth0user builds, ``field:"value"`` and
+    ``field:("a" OR "b")`` terms joined by AND, into a dict of field to allowed values.
+    """
+    terms = {}
+    for term in q.split(' AND '):
+        field, _, value = term.partition(':')
+        value = value.strip()
+        if value.startswith('(') and value.endswith(')'):
+            values = [v.strip().strip('"') for v in value[1:-1].split(' OR ')]
+        else:
+            values = [value.strip('"')]
+        terms[field.strip()] = values
+    return terms
+
+
+def _lookup(data, field):
+    for part in field.split('.'):
+        if not isinstance(data, dict):
+            return None
+        data = data.get(part)
+    return data
+
+
+class InMemoryUser(object):
+
+    """
+    An in process stand-in for the auth0plus ``User`` endpoint.
+    """
+
+    _store = {}
+    _default_connection = 'Username-Password-Authentication'
+    _updatable = [
+        'blocked',
+        'email_verified',
+        'email',
+        'verify_email',
+        'password',
+        'phone_number',
+        'phone_verified',
+        'verify_password',
+        'user_metadata',
+        'app_metadata',
+        'username'
+    ]
+
+    class DoesNotExist(ObjectDoesNotExist):
+        pass
+
+    def __init__(self, **kwargs):
+        try:  # do not store password in __dict__
+            self._password = kwargs.pop('password')
+        except KeyError:
+            pass
+        self._connection = kwargs.pop('connection', self._default_connection)
+        self._fetched = False
+        self.__dict__.update(kwargs)
+
+    def __eq__(self, other):
+        if not isinstance(other, self.__class__):
+            return False
+        return self.get_id() == other.get_id()
+
+    def __repr__(self):
+        return '<%s %s>' % (self.__class__.__name__, self.get_id() or '')
+
+    @property
+    def password(self):
+        """Get the new unsaved password."""
+        if hasattr(self, '_password'):
+            return self._password
+        raise AttributeError("'User' object does not have a new password")
+
+    @password.setter
+    def password(self, value):
+        self._password = value
+
+    @password.deleter
+    def password(self):
+        del self._password
+
+    def get_id(self):
+        return getattr(self, 'user_id', None)
+
+    def as_dict(self, updatable_only=False):
+        data = {key: value for key, value in self.__dict__.items() if key[0] != '_'}
+        if updatable_only:
+            data = {key: value for key, value in data.items() if key in self._updatable}
+        return deepcopy(data)
+
+    @classmethod
+    def _from_store(cls, data, fields=None, include_fields=True):
+        data = deepcopy(data)
+        data.pop('password', None)
+        if fields:
+            fields = fields.split(',') if not isinstance(fields, (list, tuple)) else fields
+            if include_fields in (True, 'true'):
+                data = {key: value for key, value in data.items() if key in fields}
+            else:
+                data = {key: value for key, value in data.items() if key not in fields}
+        user = cls(**data)
+        user._fetched = True
+        return user
+
+    @classmethod
+    def _filter(cls, q=None, **kwargs):
+        terms = _parse_query(q) if q else {}
+        for key, value in kwargs.items():
+            terms[key] = [value]
+        for data in cls._store.values():
+            if all(_lookup(data, field) in values for field, values in terms.items()):
+                yield data
+
+    @classmethod
+    def query(cls, fields=None, include_fields=True, **kwargs):
+        for key in ('page', 'per_page', 'sort', 'include_totals', 'search_engine', 'connection'):
+            kwargs.pop(key, None)
+        return [
+            cls._from_store(data, fields, include_fields)
+            for data in cls._filter(**kwargs)]
+
+    @classmethod
+    def get(cls, id=None, **kwargs):
+        fields = kwargs.pop('fields', None)
+        include_fields = kwargs.pop('include_fields', True)
+        if id:
+            try:
+                return cls._from_store(cls._store[id], fields, include_fields)
+            except KeyError:
+                raise cls.DoesNotExist("User Does Not Exist")
+        users = cls.query(fields=fields, include_fields=include_fields, **kwargs)
+        if len(users) > 1:
+            raise MultipleObjectsReturned("User.get returned multiple users")
+        try:
+            return users[0]
+        except IndexError:
+            raise cls.DoesNotExist("User Does Not Exist")
+
+    @classmethod
+    def create(cls, **kwargs):
+        instance = cls(**kwargs)
+        instance.save()
+        return instance
+
+    @classmethod
+    def get_or_create(cls, defaults=None, **kwargs):
+        defaults = defaults or {}
+        if kwargs:
+            try:
+                return cls.get(**kwargs), False
+            except cls.DoesNotExist:
+                defaults.update(kwargs)
+        return cls.create(**defaults), True
+
+    @classmethod
+    def delete(cls, id):
+        cls._store.pop(id, None)
+
+    def _check_email(self, email):
+        for data in self._store.values():
+            if data['email'] == email and data['user_id'] != self.get_id():
+                raise Auth0Error(
+                    status_code=409, error_code='auth0_idp_error',
+                    message='The user already exists.')
+
+    def save(self):
+        now = timezone.now().isoformat()
+        data = self.as_dict(updatable_only=True)
+        if hasattr(self, '_password'):
+            data['password'] = self._password
+        if self._fetched:
+            stored = self._store.get(self.get_id())
+            if stored is None:
+                raise Auth0Error(
+                    status_code=404, error_code='inexistent_user', message='The user does not exist.')
+            if 'email' in data:
+                self._check_email(data['email'])
+            if 'password' in data and not data['password']:
+                raise Auth0Error(
+                    status_code=400, error_code='invalid_body',
+                    message='Payload validation error: Invalid type for property: password')
+            stored.update(deepcopy(data))
+            stored['updated_at'] = now
+        else:
+            if not getattr(self, 'email', None):
+                raise Auth0Error(
+                    status_code=400, error_code='invalid_body',
+                    message='Payload validation error: Missing required property: email')
+            if not data.get('password'):
+                raise Auth0Error(
+                    status_code=400, error_code='invalid_body',
+                    message='Payload validation error: Missing required property: password')
+            self._check_email(self.email)
+            user_id = 'auth0|%s' % uuid.uuid4().hex[:24]
+            stored = {
+                'user_id': user_id,
+                'email_verified': False,
+                'user_metadata': {},
+                'app_metadata': {},
+                'identities': [{
+                    'connection': self._connection, 'user_id': user_id[6:],
+                    'provider': 'auth0', 'isSocial': False}],
+                'created_at': now,
+                'updated_at': now,
+            }
+            stored.update(deepcopy(data))
+            self._store[user_id] = stored
+            self.__dict__.update(self._from_store(stored).as_dict())
+            self._fetched = True
+        try:  # once saved the password should be deleted
+            del self.password
+        except AttributeError:
+            pass
+
+
+class InMemoryClient(BaseClient):
+
+    """
+    Client holding Auth0 users in process memory, for tests and offline development.
+
+    Authorization codes are issued with ``issue_code`` and can be exchanged once.
+    """
+
+    users = InMemoryUser
+
+    def __init__(self):
+        self._codes = {}
+        self._tokens = {}
+        self._jobs = {}
+
+    def clear(self):
+        self.users._store.clear()
+        self._codes.clear()
+        self._tokens.clear()
+        self._jobs.clear()
+
+    def import_users(self, users, upsert=False):
+        """
+        Import users straight away; the returned job is already completed.
+        """
+        job_id = 'job_%s' % uuid.uuid4().hex[:16]
+        errors = []
+        for data in deepcopy(users):
+            existing = list(self.users._filter(email=data.get('email')))
+            if existing and not upsert:
+                errors.append({'user': data, 'errors': [{
+                    'code': 'DUPLICATED_USER',
+                    'message': 'The user already exist and upsert parameter is false'}]})
+                continue
+            user_id = data.pop('user_id', None) or uuid.uuid4().hex[:24]
+            stored = existing[0] if existing else {
+                'user_id': self.get_imported_user_id(user_id),
+                'email_verified': False,
+                'user_metadata': {},
+                'app_metadata': {},
+                'identities': [{
+                    'connection': self.users._default_connection, 'user_id': user_id,
+                    'provider': 'auth0', 'isSocial': False}],
+                'created_at': timezone.now().isoformat(),
+            }
+            stored.update(data)
+            stored['updated_at'] = timezone.now().isoformat()
+            self.users._store[stored['user_id']] = stored
+        self._jobs[job_id] = {
+            'id': job_id, 'type': 'users_import', 'status': 'completed',
+            'summary': {'failed': len(errors), 'inserted': len(users) - len(errors)},
+            'errors': errors}
+        return {'id': job_id, 'type': 'users_import', 'status': 'pending'}
+
+    def set_blocked(self, user_id, blocked):
+        try:
+            self.users._store[user_id]['blocked'] = blocked
+        except KeyError:
+            raise Auth0Error(
+                status_code=404, error_code='inexistent_user', message='The user does not exist.')
+
+    def get_job(self, job_id):
+        job = dict(self._jobs[job_id])
+        job.pop('errors')
+        return job
+
+    def get_job_errors(self, job_id):
+        return deepcopy(self._jobs[job_id]['errors'])
+
+    def issue_code(self, user_id):
+        code = uuid.uuid4().hex
+        self._codes[code] = user_id
+        return code
+
+    def exchange_code(self, code, redirect_uri):
+        try:
+            user_id = self._codes.pop(code)
+        except KeyError:
+            raise Auth0Error(
+                status_code=403, error_code='invalid_grant',
+                message='Invalid authorization code')
+        access_token = uuid.uuid4().hex
+        self._tokens[access_token] = user_id
+        return {'access_token': access_token, 'token_type': 'Bearer', 'expires_in': 86400}
+
+    def get_userinfo(self, access_token):
+        try:
+            user = self.users.get(self._tokens[access_token])
+        except (KeyError, self.users.DoesNotExist):
+            raise Auth0Error(status_code=401, error_code='unauthorized', message='Unauthorized')
+        user_info = user.as_dict()
+        user_info['sub'] = user.user_id
+        return user_info
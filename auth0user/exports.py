@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming exports of site users merged with their Auth0 profiles.
+"""
+import csv
+import json
+from collections import OrderedDict
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Profile
+
+USER_FIELDS = (
+    'auth0_id', 'email', 'site_id', 'given_name', 'family_name', 'is_active', 'is_staff',
+    'is_superuser', 'date_joined', 'last_login')
+PROFILE_FIELDS = ('email_verified', 'picture', 'logins_count')
+FIELDS = USER_FIELDS + PROFILE_FIELDS
+
+CSV = 'csv'
+NDJSON = 'ndjson'
+CONTENT_TYPES = {
+    CSV: 'text/csv',
+    NDJSON: 'application/x-ndjson',
+}
+
+
+def iter_chunks(queryset, chunk_size=500):
+    """
+    Yield lists of up to ``chunk_size`` users, reading the queryset a page at a time by primary
+    key so memory use doesn't grow with the number of rows.
+    """
+    queryset = queryset.order_by('pk')
+    last_pk = None
+    while True:
+        page = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        chunk = list(page[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last_pk = chunk[-1].pk
+
+
+def iter_rows(querysets, chunk_size=500, workers=1, limiter=None):
+    """
+    Yield an ordered dict of ``FIELDS`` for each user in one or more querysets.
+
+    Profiles are fetched a chunk at a time with ``Profile.get_many``, so cached profiles come
+    from one cache lookup and the rest from concurrent Auth0 searches.
+    """
+    if not isinstance(querysets, (list, tuple)):
+        querysets = [querysets]
+    for queryset in querysets:
+        for chunk in iter_chunks(queryset, chunk_size):
+            profiles = Profile.get_many(
+                [user.auth0_id for user in chunk], fields=PROFILE_FIELDS,
+                workers=workers, limiter=limiter)
+            for user in chunk:
+                row = OrderedDict((name, getattr(user, name)) for name in USER_FIELDS)
+                profile = profiles[user.auth0_id]
+                for name in PROFILE_FIELDS:
+                    row[name] = getattr(profile, name, None)
+                yield row
+
+
+class Echo(object):
+
+    """
+    A file-like object that returns what is written, for the csv writer.
+    """
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(FIELDS)
+    for row in rows:
+        yield writer.writerow(['' if value is None else value for value in row.values()])
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+
+
+def export_lines(querysets, format=CSV, **kwargs):
+    """
+    Return a generator of the lines of an export in ``CSV`` or ``NDJSON`` format.
+    """
+    rows = iter_rows(querysets, **kwargs)
+    if format == NDJSON:
+        return ndjson_lines(rows)
+    return csv_lines(rows)
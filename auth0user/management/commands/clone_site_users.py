@@ -0,0 +1,38 @@
+"""
+Management utility to copy the users of one site, with their groups and permissions, to another.
+"""
+from __future__ import unicode_literals
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        'Used to copy the users of a site, with their groups and permissions, to another '
+        'site. Users already on the new site are skipped.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--from-site',
+            dest='from_site_id', type=int, required=True,
+            help='The site to copy users from.',
+        )
+        parser.add_argument(
+            '--to-site',
+            dest='to_site_id', type=int, required=True,
+            help='The site to copy users to.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            dest='chunk_size', type=int, default=500,
+            help='Number of users to copy at a time.',
+        )
+
+    def handle(self, *args, **options):
+        created, skipped = get_user_model()._default_manager.clone_site(
+            options['from_site_id'], options['to_site_id'], options['chunk_size'])
+        if options['verbosity'] >= 1:
+            self.stdout.write("Copied %s users, skipped %s already on the site." % (
+                created, skipped))
@@ -0,0 +1,90 @@
+"""
+Management utility to create many site users, and their Auth0 users, from a CSV file.
+"""
+from __future__ import unicode_literals
+
+import csv
+import io
+import sys
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from auth0user import provisioning
+from auth0user.utils import RateLimiter
+
+
+class Command(BaseCommand):
+    help = (
+        'Used to create site users from a CSV file with email, first_name, last_name '
+        'and email_verified columns. New Auth0 users are created with bulk import jobs.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--csv',
+            dest='csv', required=True,
+            help='Path to the CSV file of users, or - for stdin.',
+        )
+        parser.add_argument(
+            '--site',
+            dest='site_id', type=int, default=settings.SITE_ID,
+            help='Specifies site for the users.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            dest='chunk_size', type=int, default=500,
+            help='Number of rows per Auth0 import job and database insert.',
+        )
+        parser.add_argument(
+            '--workers',
+            dest='workers', type=int, default=2,
+            help='Number of concurrent Auth0 searches.',
+        )
+        parser.add_argument(
+            '--rate',
+            dest='rate', type=float, default=5,
+            help='Maximum Auth0 searches per second.',
+        )
+        parser.add_argument(
+            '--database', action='store', dest='database',
+            default=DEFAULT_DB_ALIAS,
+            help='Specifies the database to use. Default is "default".',
+        )
+
+    def execute(self, *args, **options):
+        self.stdin = options.get('stdin', sys.stdin)  # Used for testing
+        return super(Command, self).execute(*args, **options)
+
+    def handle(self, *args, **options):
+        UserModel = get_user_model()
+        if options['csv'] == '-':
+            self.import_rows(UserModel, csv.DictReader(self.stdin), options)
+        else:
+            with io.open(options['csv'], newline='', encoding='utf-8') as f:
+                self.import_rows(UserModel, csv.DictReader(f), options)
+
+    def parse_rows(self, rows):
+        for row in rows:
+            # csv fills the missing columns of short rows with None
+            row = dict((key, (value or '').strip()) for key, value in row.items() if key)
+            row['email_verified'] = row.get('email_verified', '').lower() in ('1', 'true', 'yes')
+            yield row
+
+    def import_rows(self, UserModel, rows, options):
+        counts = {provisioning.CREATED: 0, provisioning.EXISTS: 0, provisioning.FAILED: 0}
+        results = UserModel._default_manager.db_manager(options['database']).bulk_create_users(
+            self.parse_rows(rows),
+            site_id=options['site_id'],
+            chunk_size=options['chunk_size'],
+            workers=options['workers'],
+            limiter=RateLimiter(options['rate']))
+        for result in results:
+            counts[result.status] += 1
+            if result.status == provisioning.FAILED:
+                self.stderr.write("Error: %s: %s" % (result.email, result.error))
+        if options['verbosity'] >= 1:
+            self.stdout.write(
+                "Created %(created)s, already existing %(exists)s, failed %(failed)s." % counts)
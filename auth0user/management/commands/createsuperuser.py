@@ -6,7 +6,6 @@ from __future__ import unicode_literals
 import getpass
 import sys
 
-from auth0plus.management import Auth0
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
@@ -18,6 +17,8 @@ from django.utils.encoding import force_str
 from django.utils.six.moves import input
 from django.utils.text import capfirst
 
+from auth0user.clients import get_client
+
 
 class NotRunningInTTYException(Exception):
     pass
@@ -73,6 +74,7 @@ class Command(BaseCommand):
         # If not provided, create the user with an unusable password
         password = None
         auth0user = None
+        auth0_id = None
         user_data = {}
         # Same as user_data but with foreign keys as fake model instances
         # instead of raw IDs.
@@ -111,7 +113,7 @@ class Command(BaseCommand):
                     if not email:
                         continue
                     try:
-                        self.UserModel.objects.get(
+                        self.UserModel._default_manager.db_for_site(options['site_id']).get(
                             email=email,
                             site_id=options['site_id'])
                         self.stderr.write(
@@ -120,17 +122,19 @@ class Command(BaseCommand):
                         continue
                     except self.UserModel.DoesNotExist:
                         pass
-                    auth0 = Auth0(
-                        settings.AUTH0_DOMAIN,
-                        settings.AUTH0_JWT,
-                        client_id=settings.AUTH0_CLIENT_ID,
-                        default_connection=settings.AUTH0_CONNECTION)
+                    # users of other sites already know their Auth0 id
+                    identity = self.UserModel._default_manager.get_identities(
+                        [email]).get(email.lower())
+                    users = get_client().users
                     try:
-                        auth0user = auth0.users.get(email=email)
+                        if identity:
+                            auth0_id = identity[0]
+                        else:
+                            auth0user = users.get(email=email)
                         self.stderr.write(
                             'Warning: An Auth0 user with that email address '
                             'has already been created.')
-                    except auth0.users.DoesNotExist:
+                    except users.DoesNotExist:
                         pass
                 for field_name in self.UserModel.REQUIRED_FIELDS:
                     field = self.UserModel._meta.get_field(field_name)
@@ -189,6 +193,8 @@ class Command(BaseCommand):
             user_data['password'] = password
             if auth0user:
                 user_data['auth0user'] = auth0user
+            if auth0_id:
+                user_data['auth0_id'] = auth0_id
             self.UserModel._default_manager.db_manager(database).create_superuser(**user_data)
             if options['verbosity'] >= 1:
                 self.stdout.write("Superuser created successfully.")
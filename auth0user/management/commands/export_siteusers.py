@@ -0,0 +1,68 @@
+"""
+Management utility to export site users and their Auth0 profiles as CSV or NDJSON.
+"""
+from __future__ import unicode_literals
+
+import io
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from auth0user import exports
+from auth0user.utils import RateLimiter
+
+
+class Command(BaseCommand):
+    help = 'Used to export site users with their Auth0 profiles as CSV or NDJSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--site',
+            dest='site_id', type=int, default=None,
+            help='Only export users of this site.',
+        )
+        parser.add_argument(
+            '--format',
+            dest='format', choices=(exports.CSV, exports.NDJSON), default=exports.CSV,
+            help='Output format.',
+        )
+        parser.add_argument(
+            '--output',
+            dest='output', default='-',
+            help='Path to write the export to, or - for stdout.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            dest='chunk_size', type=int, default=500,
+            help='Number of users to read from the database at a time.',
+        )
+        parser.add_argument(
+            '--workers',
+            dest='workers', type=int, default=4,
+            help='Number of concurrent Auth0 requests.',
+        )
+        parser.add_argument(
+            '--rate',
+            dest='rate', type=float, default=5,
+            help='Maximum Auth0 requests per second.',
+        )
+
+    def handle(self, *args, **options):
+        manager = get_user_model()._default_manager
+        if options['site_id']:
+            querysets = [
+                manager.db_for_site(options['site_id']).filter(site_id=options['site_id'])]
+        else:
+            querysets = manager.shards()
+        lines = exports.export_lines(
+            querysets, options['format'],
+            chunk_size=options['chunk_size'],
+            workers=options['workers'],
+            limiter=RateLimiter(options['rate']))
+        if options['output'] == '-':
+            for line in lines:
+                self.stdout.write(line, ending='')
+        else:
+            with io.open(options['output'], 'w', newline='', encoding='utf-8') as f:
+                for line in lines:
+                    f.write(line)
@@ -0,0 +1,20 @@
+"""
+Management utility to drop every cached Auth0 profile of the tenant.
+"""
+from __future__ import unicode_literals
+
+from django.core.management.base import BaseCommand
+
+from auth0user.models import Profile
+
+
+class Command(BaseCommand):
+    help = (
+        'Used to invalidate every cached Auth0 profile of the tenant at once, '
+        'without flushing the rest of the cache.'
+    )
+
+    def handle(self, *args, **options):
+        generation = Profile.bump_cache_generation()
+        if options['verbosity'] >= 1:
+            self.stdout.write("Profile cache generation is now %s." % generation)
@@ -0,0 +1,271 @@
+"""
+Management utility to adopt the users of a django.contrib.auth style user table as site users.
+"""
+from __future__ import unicode_literals
+
+import io
+import os
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
+from django.utils import timezone
+
+from auth0user import provisioning
+from auth0user.backends import invalidate_token_users
+from auth0user.models import Profile
+from auth0user.utils import RateLimiter
+
+# os.rename also replaces an existing file in one step on POSIX, for Python 2
+replace = getattr(os, 'replace', os.rename)
+
+LEGACY_FIELDS = (
+    'id', 'email', 'password', 'first_name', 'last_name', 'is_active', 'is_staff',
+    'is_superuser', 'date_joined', 'last_login')
+
+
+class Command(BaseCommand):
+    help = (
+        'Used to create site users, and their Auth0 users, from an existing '
+        'django.contrib.auth user table, copying group and permission memberships.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--table',
+            dest='table', default='auth_user',
+            help='The legacy user table, with <table>_groups and <table>_user_permissions.',
+        )
+        parser.add_argument(
+            '--site',
+            dest='site_ids', type=int, action='append', default=[],
+            help='Site to add the users to, may be repeated. Defaults to SITE_ID.',
+        )
+        parser.add_argument(
+            '--export',
+            dest='export', default=None,
+            help='An Auth0 users export file (NDJSON, optionally gzipped) to match emails from.',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            dest='checkpoint', default=None,
+            help='File recording the last migrated legacy user id, to resume from.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            dest='chunk_size', type=int, default=500,
+            help='Number of legacy users per Auth0 import job and database insert.',
+        )
+        parser.add_argument(
+            '--workers',
+            dest='workers', type=int, default=2,
+            help='Number of concurrent Auth0 searches.',
+        )
+        parser.add_argument(
+            '--rate',
+            dest='rate', type=float, default=5,
+            help='Maximum Auth0 searches per second.',
+        )
+        parser.add_argument(
+            '--database', action='store', dest='database',
+            default=DEFAULT_DB_ALIAS,
+            help='The database of the legacy user table. Default is "default".',
+        )
+
+    def handle(self, *args, **options):
+        self.UserModel = get_user_model()
+        self.verbosity = options['verbosity']
+        site_ids = options['site_ids'] or [settings.SITE_ID]
+        exported = {}
+        if options['export']:
+            exported = provisioning.load_auth0_export(options['export'])
+        limiter = RateLimiter(options['rate'])
+        counts = {provisioning.CREATED: 0, provisioning.EXISTS: 0, provisioning.FAILED: 0}
+
+        last_id = self.read_checkpoint(options['checkpoint'])
+        chunks = self.iter_legacy_users(
+            options['database'], options['table'], last_id, options['chunk_size'])
+        for rows in chunks:
+            identities = self.resolve_identities(rows, exported, options['workers'], limiter)
+            for row in rows:
+                if row['email'].lower() not in identities:
+                    counts[provisioning.FAILED] += 1
+                    self.stderr.write("Error: %s: %s" % (
+                        row['email'] or row['id'], row.get('error', 'No Auth0 user')))
+            memberships = self.get_memberships(options['database'], options['table'], rows)
+            for site_id in site_ids:
+                # users and their memberships are saved together, so a rerun that finds the
+                # users existing never misses their groups and permissions
+                with transaction.atomic(
+                        using=router.db_for_write(self.UserModel, site_id=site_id)):
+                    created = self.create_site_users(
+                        site_id, rows, identities, memberships, options['database'])
+                # bulk inserts skip the post_save signal that drops cached token users
+                invalidate_token_users(
+                    (identity[0], site_id) for identity in identities.values())
+                for status, count in created.items():
+                    counts[status] += count
+            self.write_checkpoint(options['checkpoint'], rows[-1]['id'])
+            if self.verbosity >= 2:
+                self.stdout.write("Migrated legacy users up to id %s" % rows[-1]['id'])
+        if self.verbosity >= 1:
+            self.stdout.write(
+                "Created %(created)s, already existing %(exists)s, failed %(failed)s." % counts)
+
+    def read_checkpoint(self, path):
+        if path and os.path.exists(path):
+            with io.open(path, encoding='utf-8') as f:
+                return int(f.read().strip() or 0)
+        return 0
+
+    def write_checkpoint(self, path, last_id):
+        if not path:
+            return
+        # replaced in one step so an interrupted run never leaves a partial checkpoint
+        with io.open(path + '.tmp', 'w', encoding='utf-8') as f:
+            f.write('%s' % last_id)
+        replace(path + '.tmp', path)
+
+    def iter_legacy_users(self, database, table, last_id, chunk_size):
+        """
+        Yield lists of legacy user dicts ordered by id, a page at a time after ``last_id``.
+        """
+        connection = connections[database]
+        normalize_email = self.UserModel._default_manager.normalize_email
+        sql = 'SELECT %s FROM %s WHERE %s > %%s ORDER BY %s LIMIT %%s' % (
+            ', '.join(connection.ops.quote_name(name) for name in LEGACY_FIELDS),
+            connection.ops.quote_name(table),
+            connection.ops.quote_name('id'),
+            connection.ops.quote_name('id'))
+        while True:
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [last_id, chunk_size])
+                rows = [dict(zip(LEGACY_FIELDS, row)) for row in cursor.fetchall()]
+            if not rows:
+                return
+            for row in rows:
+                row['email'] = normalize_email((row['email'] or '').strip())
+                # raw queries skip the conversion to aware datetimes on some databases
+                for name in ('date_joined', 'last_login'):
+                    if settings.USE_TZ and row[name] and timezone.is_naive(row[name]):
+                        row[name] = timezone.make_aware(row[name], timezone.utc)
+            yield rows
+            last_id = rows[-1]['id']
+
+    def resolve_identities(self, rows, exported, workers, limiter):
+        """
+        Return a dict of lowercased email to ``(auth0_id, given_name, family_name)``, matched
+        from the export, existing site users, Auth0 searches or else created by an import job.
+        """
+        legacy = OrderedDict((row['email'].lower(), row) for row in rows if row['email'])
+        identities = dict(
+            (email, (exported[email], row['first_name'], row['last_name']))
+            for email, row in legacy.items() if email in exported)
+        identities.update(self.UserModel._default_manager.get_identities(
+            [email for email in legacy if email not in identities]))
+        for email, auth0user in provisioning.resolve_auth0_users(
+                [email for email in legacy if email not in identities],
+                workers, limiter).items():
+            profile = Profile(auth0user)
+            identities[email] = (auth0user.user_id, profile.given_name, profile.family_name)
+
+        missing = [row for email, row in legacy.items() if email not in identities]
+        if missing:
+            imported = provisioning.import_auth0_users([
+                {
+                    'email': row['email'],
+                    'email_verified': False,
+                    'user_metadata': {
+                        'given_name': row['first_name'],
+                        'family_name': row['last_name']},
+                }
+                for row in missing])
+            for row in missing:
+                auth0_id, error = imported.get(row['email'].lower(), (None, 'Not imported'))
+                if auth0_id:
+                    identities[row['email'].lower()] = (
+                        auth0_id, row['first_name'], row['last_name'])
+                else:
+                    row['error'] = error
+        return identities
+
+    def get_memberships(self, database, table, rows):
+        """
+        Return a dict of m2m field name to ``(legacy user id, related id)`` pairs for the rows.
+        """
+        connection = connections[database]
+        ids = [row['id'] for row in rows]
+        memberships = {}
+        for name, column in (('groups', 'group_id'), ('user_permissions', 'permission_id')):
+            sql = 'SELECT %s, %s FROM %s WHERE %s IN (%s)' % (
+                connection.ops.quote_name('user_id'),
+                connection.ops.quote_name(column),
+                connection.ops.quote_name('%s_%s' % (table, name)),
+                connection.ops.quote_name('user_id'),
+                ', '.join(['%s'] * len(ids)))
+            with connection.cursor() as cursor:
+                cursor.execute(sql, ids)
+                memberships[name] = cursor.fetchall()
+        return memberships
+
+    def create_site_users(self, site_id, rows, identities, memberships, database):
+        """
+        Insert the site users of a chunk not already on the site, then their memberships.
+
+        Groups and permissions are matched between the legacy ``database`` and the site's shard.
+        """
+        counts = {provisioning.CREATED: 0, provisioning.EXISTS: 0, provisioning.FAILED: 0}
+        manager = self.UserModel._default_manager.db_for_site(site_id)
+        auth0_ids = dict(
+            (row['id'], identities[row['email'].lower()][0])
+            for row in rows if row['email'].lower() in identities)
+        existing = set(manager.filter(
+            site_id=site_id, auth0_id__in=set(auth0_ids.values())).values_list(
+                'auth0_id', flat=True))
+        local_password = getattr(settings, 'AUTH0_LOCAL_PASSWORD', True)
+
+        users = OrderedDict()
+        created = {}  # legacy id to the auth0 id of the users it creates
+        for row in rows:
+            auth0_id = auth0_ids.get(row['id'])
+            if not auth0_id:
+                continue
+            if auth0_id in existing:
+                counts[provisioning.EXISTS] += 1
+            elif auth0_id in users:
+                counts[provisioning.FAILED] += 1
+                self.stderr.write("Error: %s: Duplicate email" % row['email'])
+            else:
+                auth0_id, given_name, family_name = identities[row['email'].lower()]
+                created[row['id']] = auth0_id
+                users[auth0_id] = self.UserModel(
+                    auth0_id=auth0_id, email=row['email'], site_id=site_id,
+                    given_name=given_name or '', family_name=family_name or '',
+                    password=row['password'] if local_password else make_password(None),
+                    is_active=row['is_active'], is_staff=row['is_staff'],
+                    is_superuser=row['is_superuser'], date_joined=row['date_joined'],
+                    last_login=row['last_login'])
+        manager.bulk_create(users.values())
+        counts[provisioning.CREATED] += len(users)
+
+        # the new primary keys, as bulk_create doesn't set them on every database
+        pks = dict(manager.filter(
+            site_id=site_id, auth0_id__in=list(users)).values_list('auth0_id', 'pk'))
+        for name, pairs in memberships.items():
+            field = self.UserModel._meta.get_field(name)
+            through = field.remote_field.through
+            source, target = field.m2m_field_name(), field.m2m_reverse_field_name()
+            pairs = [(user_id, related_id) for user_id, related_id in pairs
+                     if created.get(user_id) in pks]
+            related_ids = self.UserModel._default_manager.get_related_ids(
+                name, [related_id for user_id, related_id in pairs], database,
+                router.db_for_write(field.related_model, site_id=site_id))
+            through._default_manager.db_manager(hints={'site_id': site_id}).bulk_create([
+                through(**{
+                    '%s_id' % source: pks[created[user_id]],
+                    '%s_id' % target: related_ids[related_id]})
+                for user_id, related_id in pairs if related_id in related_ids])
+        return counts
@@ -0,0 +1,54 @@
+"""
+Management utility to copy Auth0 profile names to the local name columns.
+"""
+from __future__ import unicode_literals
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from auth0user.models import Profile
+from auth0user.utils import RateLimiter, chunked
+
+
+class Command(BaseCommand):
+    help = 'Used to fill the given_name and family_name columns of site users from Auth0.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--site',
+            dest='site_id', type=int, default=None,
+            help='Only sync users on this site.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            dest='chunk_size', type=int, default=500,
+            help='Number of users to read from the database at a time.',
+        )
+        parser.add_argument(
+            '--workers',
+            dest='workers', type=int, default=4,
+            help='Number of concurrent Auth0 requests.',
+        )
+        parser.add_argument(
+            '--rate',
+            dest='rate', type=float, default=5,
+            help='Maximum Auth0 requests per second.',
+        )
+
+    def handle(self, *args, **options):
+        manager = get_user_model()._default_manager
+        if options['site_id']:
+            shards = [manager.db_for_site(options['site_id']).filter(site_id=options['site_id'])]
+        else:
+            shards = manager.shards()
+
+        limiter = RateLimiter(options['rate'])
+        synced = 0
+        for users in shards:
+            auth0_ids = users.order_by().values_list('auth0_id', flat=True).distinct()
+            for chunk in chunked(auth0_ids.iterator(), options['chunk_size']):
+                manager.sync_names(
+                    Profile.get_many(chunk, workers=options['workers'], limiter=limiter))
+                synced += len(chunk)
+        if options['verbosity'] >= 1:
+            self.stdout.write("Synced names of %s users." % synced)
@@ -0,0 +1,77 @@
+"""
+Management utility to fill the profile cache for recently active users.
+"""
+from __future__ import unicode_literals
+
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from auth0user.models import Profile
+from auth0user.utils import RateLimiter, chunked
+
+
+class Command(BaseCommand):
+    help = 'Used to warm the Auth0 profile cache for recently active users.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            dest='days', type=int, default=30,
+            help='Warm profiles of users that logged in within this many days.',
+        )
+        parser.add_argument(
+            '--site',
+            dest='site_id', type=int, default=None,
+            help='Only warm profiles of users on this site.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            dest='chunk_size', type=int, default=500,
+            help='Number of users to read from the database at a time.',
+        )
+        parser.add_argument(
+            '--workers',
+            dest='workers', type=int, default=4,
+            help='Number of concurrent Auth0 requests.',
+        )
+        parser.add_argument(
+            '--rate',
+            dest='rate', type=float, default=5,
+            help='Maximum Auth0 requests per second.',
+        )
+        parser.add_argument(
+            '--stagger',
+            dest='stagger', type=int, default=None,
+            help=(
+                'Spread cache expiry over up to this many extra seconds. '
+                'Defaults to the AUTH0_PROFILE_CACHE timeout.'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        manager = get_user_model()._default_manager
+        since = timezone.now() - timedelta(days=options['days'])
+        if options['site_id']:
+            shards = [manager.db_for_site(options['site_id']).filter(site_id=options['site_id'])]
+        else:
+            shards = manager.shards()
+
+        stagger = options['stagger']
+        if stagger is None:
+            stagger = Profile._get_cache_timeout()
+        limiter = RateLimiter(options['rate'])
+        warmed = 0
+        for users in shards:
+            users = users.filter(last_login__gte=since, is_active=True)
+            auth0_ids = users.order_by().values_list('auth0_id', flat=True).distinct()
+            for chunk in chunked(auth0_ids.iterator(), options['chunk_size']):
+                profiles = Profile.get_many(
+                    chunk, workers=options['workers'], limiter=limiter, stagger=stagger)
+                warmed += len(profiles)
+                if options['verbosity'] >= 2:
+                    self.stdout.write("Warmed %s profiles" % warmed)
+        if options['verbosity'] >= 1:
+            self.stdout.write("Warmed %s profiles." % warmed)
@@ -1,8 +1,22 @@
 from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.functional import SimpleLazyObject
+
+from . import backends, claims, models, routers, sites
+
+TOKEN_BACKEND = 'auth0user.backends.Auth0TokenBackend'
 
 
 def auth0user_middleware(get_response):
     def middleware(request):
+        # users are looked up on the site of the request from here on
+        sites.set_current_site_id(sites.get_request_site_id(request))
+        routers.pin_request(request)
+        claims.start_request()
+        # one Profile per person for the whole request
+        models.start_identity_map()
+        request.auth0_claims = SimpleLazyObject(lambda: claims.get_claims(request))
         if getattr(request, 'user') and not request.user.is_authenticated():
             redirect_host = ''.join([request.scheme, '://', request.get_host()])
             request.auth0 = {
@@ -10,6 +24,41 @@ def auth0user_middleware(get_response):
                 'domain': settings.AUTH0_DOMAIN,
                 'redirect_host': redirect_host
             }
-        response = get_response(request)
+        try:
+            response = get_response(request)
+            claims.finish_request(request)
+            routers.set_pin_cookie(response)
+        finally:
+            sites.clear_current_site_id()
+            routers.unpin()
+            models.clear_identity_map()
         return response
     return middleware
+
+
+def auth0_token_middleware(get_response):
+    """
+    Authenticates requests with an ``Authorization: Bearer <token>`` header from the token
+    alone, leaving requests without one to the session. Place it after
+    AuthenticationMiddleware and before auth0user_middleware.
+    """
+    if backends.jwt is None:
+        raise ImproperlyConfigured(
+            'auth0_token_middleware requires PyJWT, pip install django-auth0user[jwt]')
+    backend = backends.Auth0TokenBackend()
+
+    def middleware(request):
+        scheme, _, token = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+        if scheme.lower() == 'bearer' and token:
+            sites.set_current_site_id(sites.get_request_site_id(request))
+            try:
+                user = backend.authenticate(request, token=token.strip())
+            finally:
+                sites.clear_current_site_id()
+            if user is not None:
+                user.backend = TOKEN_BACKEND
+                # tokens aren't sent by browsers on their own, unlike session cookies
+                request._dont_enforce_csrf_checks = True
+            request.user = user or AnonymousUser()
+        return get_response(request)
+    return middleware
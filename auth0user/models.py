@@ -1,37 +1,97 @@
 # -*- coding: utf-8 -*-
 
+import hashlib
+import json
 import logging
-
-from auth0plus.exceptions import Auth0Error
-from auth0plus.management import Auth0
+import random
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 
 from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
 from django.conf import settings
 from django.contrib.sites.models import Site
 from django.contrib.sites.managers import CurrentSiteManager
 from django.core.mail import send_mail
+from django.contrib.auth import get_user_model
 from django.contrib.auth.base_user import AbstractBaseUser
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import BaseUserManager, PermissionsMixin
-from django.db import models
+from django.db import DatabaseError, IntegrityError, models, router, transaction
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 
 from model_utils.fields import AutoCreatedField, AutoLastModifiedField
 
+from . import provisioning, sites
+from .clients import ClientUsers, get_client
+from .routers import get_shard_aliases
+from .signals import profile_saved
+from .utils import AUTH0_ERRORS, CallPolicy, LatencyStats, chunked, concurrent_map
+
 logger = logging.getLogger(__name__)
 
 CACHE_PROFILE_DEFAULT = 60
+# fields Auth0 updates on every login, left out when comparing profiles
+VOLATILE_FIELDS = ('last_login', 'last_ip', 'logins_count', 'updated_at')
+
+# seconds a process reuses the cache generation before reading it again
+GENERATION_MEMO_DEFAULT = 5
+# attempts, and seconds between them, to take the lock of the projection registry
+PROJECTION_LOCK_RETRIES = 10
+PROJECTION_LOCK_WAIT = 0.01
+
+# latencies and retries of Auth0 profile reads
+profile_stats = LatencyStats()
+# cache namespace to (generation, time to read it again)
+_generations = {}
+# auth0 id to the one Profile of each user within the current request
+_identities = threading.local()
+
+
+def start_identity_map():
+    _identities.profiles = {}
+
+
+def clear_identity_map():
+    _identities.profiles = None
+
+
+def share_identity_map(func):
+    """
+    Wrap ``func`` to run on another thread with the identity map of the calling thread.
+    """
+    profiles = getattr(_identities, 'profiles', None)
+
+    def wrapper(*args, **kwargs):
+        _identities.profiles = profiles
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _identities.profiles = None
+    return wrapper
+
+
+@contextmanager
+def identity_map():
+    """
+    Share one Profile per user within the block, as the auth0user middleware does for a request.
+    """
+    previous = getattr(_identities, 'profiles', None)
+    start_identity_map()
+    try:
+        yield
+    finally:
+        _identities.profiles = previous
 
 
 class Profile(object):
     
-    _Auth0User = Auth0(
-        settings.AUTH0_DOMAIN,
-        settings.AUTH0_JWT,
-        client_id=settings.AUTH0_CLIENT_ID,
-        default_connection=settings.AUTH0_CONNECTION).users
+    _Auth0User = ClientUsers()
     
-    def __init__(self, auth0user=None):
+    def __init__(self, auth0user=None, fields=None):
 
         if auth0user:
             kwargs = auth0user.as_dict()
@@ -42,78 +102,485 @@ class Profile(object):
                 'app_metadata': {},
             }
         self._auth0user = auth0user
+        # the fields fetched from Auth0 or None for the complete user
+        self._fields = fields
 
         self.__dict__.update(kwargs)
 
     @classmethod
-    def _get_cache_key(cls, auth0_id):
-        return 'auth0user.userprofile.%s' % auth0_id
+    def _get_fields(cls, fields):
+        if fields:
+            return tuple(sorted(set(fields) | set(['user_id'])))
+
+    @classmethod
+    def _get_cache_namespace(cls):
+        """
+        Keep the profiles of each Auth0 tenant and connection apart in a shared cache
+        """
+        return '%s.%s' % (
+            getattr(settings, 'AUTH0_DOMAIN', None) or 'local',
+            getattr(settings, 'AUTH0_CONNECTION', None) or 'default')
+
+    @classmethod
+    def get_cache_generation(cls):
+        """
+        Return the generation in every profile cache key of this tenant.
+
+        It is read from the cache at most every ``settings.AUTH0_CACHE_GENERATION_MEMO``
+        seconds. A lost generation restarts from the current time so it is never reused.
+        """
+        namespace = cls._get_cache_namespace()
+        generation, expires = _generations.get(namespace, (None, 0))
+        if expires > time.time():
+            return generation
+        key = 'auth0user.generation.%s' % namespace
+        generation = cache.get(key)
+        if generation is None:
+            cache.add(key, int(time.time()), None)
+            generation = cache.get(key) or int(time.time())
+        _generations[namespace] = (generation, time.time() + getattr(
+            settings, 'AUTH0_CACHE_GENERATION_MEMO', GENERATION_MEMO_DEFAULT))
+        return generation
+
+    @classmethod
+    def bump_cache_generation(cls):
+        """
+        Invalidate every cached profile of this tenant at once by moving to a new generation.
+
+        Other processes pick it up within ``settings.AUTH0_CACHE_GENERATION_MEMO`` seconds.
+        """
+        namespace = cls._get_cache_namespace()
+        _generations.pop(namespace, None)
+        generation = max(cls.get_cache_generation() + 1, int(time.time()))
+        cache.set('auth0user.generation.%s' % namespace, generation, None)
+        _generations.pop(namespace, None)
+        return generation
+
+    @classmethod
+    def _get_cache_key(cls, auth0_id, fields=None):
+        key = 'auth0user.userprofile.%s.%s.%s' % (
+            cls._get_cache_namespace(), cls.get_cache_generation(), auth0_id)
+        if fields:
+            key = '%s.%s' % (key, ','.join(fields))
+        return key
+
+    @classmethod
+    def _add_projection(cls, fields):
+        """
+        Record the fields of a cached projection, so saves and invalidations can drop it.
+
+        The registry is shared by every process, so it is updated under a lock taken with
+        ``cache.add``, or without it when the lock can't be had after a few attempts.
+        """
+        key = 'auth0user.projections.%s' % cls._get_cache_namespace()
+        if fields in (cache.get(key) or set()):
+            return
+        lock = '%s.lock' % key
+        for attempt in range(PROJECTION_LOCK_RETRIES):
+            if cache.add(lock, True, 5):
+                break
+            time.sleep(PROJECTION_LOCK_WAIT)
+        else:
+            logger.warning("Could not lock the cached projections, updating them unlocked")
+            lock = None
+        try:
+            projections = cache.get(key) or set()
+            if fields not in projections:
+                cache.set(key, projections | set([fields]), None)
+        finally:
+            if lock:
+                cache.delete(lock)
+
+    @classmethod
+    def _get_projection_keys(cls, auth0_ids):
+        """
+        Return the cache keys, with their ``.meta`` keys, of every cached projection of users
+        """
+        projections = cache.get('auth0user.projections.%s' % cls._get_cache_namespace()) or set()
+        fields = cls._get_fields(get_user_model().PROFILE_FIELDS)
+        if fields:
+            projections = projections | set([fields])
+        keys = [
+            cls._get_cache_key(auth0_id, fields)
+            for auth0_id in auth0_ids for fields in projections]
+        return keys + ['%s.meta' % key for key in keys]
 
     @classmethod
-    def get(cls, auth0_id=None):
+    def _get_cache_timeout(cls, stagger=0):
+        """
+        Add up to ``stagger`` random seconds so entries cached together expire apart
+        """
+        timeout = getattr(settings, 'AUTH0_PROFILE_CACHE', CACHE_PROFILE_DEFAULT)
+        if stagger:
+            timeout += random.randint(0, stagger)
+        return timeout
+
+    @classmethod
+    def _get_digest(cls, auth0user):
+        data = dict(
+            (key, value) for key, value in auth0user.as_dict().items()
+            if key not in VOLATILE_FIELDS)
+        return hashlib.sha1(
+            json.dumps(data, sort_keys=True, cls=DjangoJSONEncoder).encode('utf-8')).hexdigest()
+
+    @classmethod
+    def _set_cached(cls, auth0users, fields=None, stagger=0):
+        """
+        Cache fetched Auth0 users.
+
+        When ``settings.AUTH0_PROFILE_CACHE_MAX`` is above ``AUTH0_PROFILE_CACHE`` the timeout of
+        a profile doubles each time it is fetched unchanged, up to the max, and drops back to
+        ``AUTH0_PROFILE_CACHE`` when it has changed, been saved or been invalidated.
+        """
+        timeout = getattr(settings, 'AUTH0_PROFILE_CACHE', CACHE_PROFILE_DEFAULT)
+        max_timeout = getattr(settings, 'AUTH0_PROFILE_CACHE_MAX', timeout)
+        if fields:
+            cls._add_projection(fields)
+        keys = dict(
+            (cls._get_cache_key(auth0user.user_id, fields), auth0user)
+            for auth0user in auth0users)
+        timeouts = dict.fromkeys(keys, timeout)
+        if max_timeout > timeout:
+            # the content digest and timeout of each profile when last cached
+            meta = cache.get_many(['%s.meta' % key for key in keys])
+            updated = {}
+            for key, auth0user in keys.items():
+                digest = cls._get_digest(auth0user)
+                previous = meta.get('%s.meta' % key)
+                if previous and previous[0] == digest:
+                    timeouts[key] = min(previous[1] * 2, max_timeout)
+                updated['%s.meta' % key] = (digest, timeouts[key])
+            cache.set_many(updated, max_timeout * 4)
+        for key, auth0user in keys.items():
+            cache.set(
+                key, auth0user, timeouts[key] + (random.randint(0, stagger) if stagger else 0))
+
+    @classmethod
+    def _get_cached(cls, auth0_ids, fields=None):
+        """
+        Return a dict of auth0_id to (auth0user, fields) from the cache. A cached complete
+        user also satisfies a projection.
+        """
+        keys = dict((cls._get_cache_key(auth0_id), (auth0_id, None)) for auth0_id in auth0_ids)
+        if fields:
+            keys.update(
+                (cls._get_cache_key(auth0_id, fields), (auth0_id, fields))
+                for auth0_id in auth0_ids)
+        cached = {}
+        for key, auth0user in cache.get_many(list(keys)).items():
+            auth0_id, key_fields = keys[key]
+            if auth0_id not in cached or key_fields is None:
+                cached[auth0_id] = (auth0user, key_fields)
+        return cached
+
+    @classmethod
+    def _get_mapped(cls, auth0_id, fields=None):
+        """
+        Return the profile of the identity map and the fields to fetch it with when it lacks
+        some of ``fields``, or None for a profile to fetch.
+        """
+        profiles = getattr(_identities, 'profiles', None)
+        profile = profiles.get(auth0_id) if profiles else None
+        if profile is None:
+            return None, fields
+        if profile._fields is None or (fields and set(fields) <= set(profile._fields)):
+            return profile, fields
+        # fetched again with the fields of both, to be merged into the mapped profile
+        return None, fields and tuple(sorted(set(fields) | set(profile._fields)))
+
+    @classmethod
+    def _map(cls, auth0_id, profile):
+        """
+        Return the one profile of ``auth0_id`` within the identity map, adding ``profile`` or
+        merging its wider fields into the mapped profile, keeping any unsaved changes.
+        """
+        profiles = getattr(_identities, 'profiles', None)
+        if profiles is None or not auth0_id:
+            return profile
+        mapped = profiles.setdefault(auth0_id, profile)
+        if mapped is not profile and profile._auth0user:
+            changed = mapped._get_changed() if mapped._auth0user else {}
+            mapped.__dict__.update(profile.__dict__)
+            mapped.__dict__.update(changed)
+        return mapped
+
+    @classmethod
+    def _get_call_policy(cls):
+        return CallPolicy(
+            profile_stats,
+            hedge=getattr(settings, 'AUTH0_HEDGE', False),
+            percentile=getattr(settings, 'AUTH0_HEDGE_PERCENTILE', 95),
+            retries=getattr(settings, 'AUTH0_RETRIES', 0),
+            deadline=getattr(settings, 'AUTH0_DEADLINE', None))
+
+    @classmethod
+    def get_latency_stats(cls):
+        """
+        Return counts of Auth0 profile reads, errors, retries and hedges, and the p50, p95
+        and p99 latencies in seconds of recent reads.
+        """
+        return profile_stats.summary()
+
+    @classmethod
+    def get(cls, auth0_id=None, fields=None):
+        """
+        Return the profile of an Auth0 user.
+
+        :param str auth0_id: the Auth0 user id
+        :param fields: only fetch these Auth0 user fields, eg ``('email', 'user_metadata')``
+        """
         if not auth0_id:
             return cls()
-        key = cls._get_cache_key(auth0_id)
-        auth0user = cache.get(key)
-        if not auth0user:
+        mapped, fields = cls._get_mapped(auth0_id, cls._get_fields(fields))
+        if mapped is not None:
+            return mapped
+        auth0user, cached_fields = cls._get_cached([auth0_id], fields).get(auth0_id, (None, None))
+        if auth0user:
+            fields = cached_fields
+        else:
             try:
-                auth0user = cls._Auth0User.get(auth0_id)
-                cache.set(
-                    key, auth0user,
-                    getattr(settings, 'AUTH0_PROFILE_CACHE', CACHE_PROFILE_DEFAULT))
-            except (cls._Auth0User.DoesNotExist, Auth0Error):
+                call = cls._get_call_policy()
+                if fields:
+                    auth0user = call(lambda: cls._Auth0User.get(
+                        auth0_id, fields=','.join(fields), include_fields=True))
+                else:
+                    auth0user = call(lambda: cls._Auth0User.get(auth0_id))
+                    ProfileSnapshot.objects.store([auth0user])
+                cls._set_cached([auth0user], fields)
+            except cls._Auth0User.DoesNotExist:
                 logger.error("UserProfile Could not get auth0 user", exc_info=True)
                 auth0user = None
+            except AUTH0_ERRORS:
+                logger.error("UserProfile Could not get auth0 user", exc_info=True)
+                auth0user = ProfileSnapshot.objects.get_auth0users([auth0_id]).get(auth0_id)
+                fields = None
 
-        userprofile = cls(auth0user)
-        return userprofile
+        userprofile = cls(auth0user, fields if auth0user else None)
+        return cls._map(auth0_id, userprofile)
+
+    @classmethod
+    def _fetch_many(cls, auth0_ids, fields=None):
+        try:
+            return cls._get_call_policy()(lambda: get_client().get_users(auth0_ids, fields))
+        except AUTH0_ERRORS:
+            logger.error("UserProfile Could not get auth0 users", exc_info=True)
+
+    @classmethod
+    def get_many(cls, auth0_ids, fields=None, workers=1, limiter=None, stagger=0):
+        """
+        Return a dict of auth0_id to Profile for many users at once.
+
+        Cache misses are fetched with one Auth0 search per batch of ids, running up to
+        ``workers`` searches concurrently and waiting on ``limiter`` before each.
+        """
+        requested = fields = cls._get_fields(fields)
+        profiles = {}
+        for auth0_id in set(auth0_id for auth0_id in auth0_ids if auth0_id):
+            profiles[auth0_id], wider = cls._get_mapped(auth0_id, requested)
+            if fields and wider:
+                fields = tuple(sorted(set(fields) | set(wider)))
+        unmapped = [
+            auth0_id for auth0_id in auth0_ids if auth0_id and profiles[auth0_id] is None]
+        auth0users = cls._get_cached(unmapped, fields) if unmapped else {}
+        missing = [auth0_id for auth0_id in unmapped if auth0_id not in auth0users]
+        if missing:
+            failed = []
+            batches = list(chunked(missing, get_client().search_batch_size))
+            results = concurrent_map(
+                lambda batch: cls._fetch_many(batch, fields), batches, workers, limiter)
+            for batch, fetched in zip(batches, results):
+                if fetched is None:
+                    failed.extend(batch)
+                    continue
+                for auth0user in fetched:
+                    auth0users[auth0user.user_id] = (auth0user, fields)
+                cls._set_cached(fetched, fields, stagger)
+                if not fields:
+                    ProfileSnapshot.objects.store(fetched)
+            if failed:
+                auth0users.update(
+                    (auth0_id, (auth0user, None)) for auth0_id, auth0user
+                    in ProfileSnapshot.objects.get_auth0users(failed).items())
+        return dict(
+            (auth0_id, profiles.get(auth0_id) or cls._map(
+                auth0_id, cls(*auth0users.get(auth0_id, (None, None)))))
+            for auth0_id in auth0_ids)
+
+    @classmethod
+    def invalidate_many(cls, auth0_ids, refresh=False):
+        """
+        Drop the cached profiles of many users, optionally fetching them again straight away
+        """
+        keys = [cls._get_cache_key(auth0_id) for auth0_id in auth0_ids]
+        cache.delete_many(
+            keys + ['%s.meta' % key for key in keys] + cls._get_projection_keys(auth0_ids))
+        if refresh:
+            get_user_model()._default_manager.sync_names(cls.get_many(auth0_ids))
 
     @property
     def given_name(self):
         """
         Given name may be set externally to Auth0 which takes precedance over user_metadata
         """
-        return self.__dict__.get('given_name', self.user_metadata.get('given_name', ''))
+        return self.__dict__.get(
+            'given_name', getattr(self, 'user_metadata', {}).get('given_name', ''))
 
     @given_name.setter
     def given_name(self, value):
-        self.user_metadata['given_name'] = value
+        self.__dict__.setdefault('user_metadata', {})['given_name'] = value
 
     @property
     def family_name(self):
         """
         Family name may be set externally to Auth0 which takes precedance over user_metadata
         """
-        return self.__dict__.get('family_name', self.user_metadata.get('family_name', ''))
+        return self.__dict__.get(
+            'family_name', getattr(self, 'user_metadata', {}).get('family_name', ''))
 
     @family_name.setter
     def family_name(self, value):
-        self.user_metadata['family_name'] = value
+        self.__dict__.setdefault('user_metadata', {})['family_name'] = value
+
+    def _get_changed(self):
+        changed = {}
+        for key in self._auth0user._updatable:
+            try:
+                value = getattr(self, key)
+            except AttributeError:
+                continue
+            if value != getattr(self._auth0user, key, None):
+                changed[key] = value
+        return changed
 
     def save(self):
-        if self._auth0user:
+        if not self._auth0user:
+            return
+        if self._fields:
+            # a projection is saved onto the complete user, only if something changed
+            changed = self._get_changed()
+            if not changed:
+                return
+            cache.delete(self._get_cache_key(self._auth0user.user_id, self._fields))
+            auth0user = self._Auth0User.get(self._auth0user.user_id)
+            for key, value in changed.items():
+                if isinstance(value, dict):  # Auth0 merges metadata so we do too
+                    value = dict(getattr(auth0user, key, None) or {}, **value)
+                setattr(auth0user, key, value)
+            self.__dict__.update(auth0user.as_dict())
+            self._auth0user = auth0user
+            self._fields = None
+        else:
             for key in self._auth0user._updatable:
                 try:
                     value = getattr(self, key)
                 except AttributeError:
                     continue
                 setattr(self._auth0user, key, value)
-            cache.set(
-                self._get_cache_key(self._auth0user.user_id),
-                self._auth0user,
-                getattr(settings, 'AUTH0_PROFILE_CACHE', CACHE_PROFILE_DEFAULT))
-            self._auth0user.save()
+        # a profile changed here starts again at the shortest timeout, and its stale
+        # projections are dropped
+        cache.delete_many(
+            ['%s.meta' % self._get_cache_key(self._auth0user.user_id)] +
+            self._get_projection_keys([self._auth0user.user_id]))
+        self._set_cached([self._auth0user])
+        self._auth0user.save()
+        ProfileSnapshot.objects.store([self._auth0user])
+        profile_saved.send(sender=self.__class__, profile=self)
+
+
+class ProfileSnapshotManager(models.Manager):
+
+    # the profile fields kept locally
+    fields = (
+        'user_id', 'email', 'email_verified', 'blocked', 'name', 'nickname', 'picture',
+        'given_name', 'family_name', 'user_metadata', 'app_metadata')
+
+    def enabled(self):
+        return getattr(settings, 'AUTH0_PROFILE_SNAPSHOTS', False)
+
+    def store(self, auth0users):
+        """
+        Record the current profile fields of Auth0 users, if snapshots are enabled.
+
+        Database errors are logged rather than raised so a snapshot never fails a profile read.
+        """
+        if not self.enabled() or not auth0users:
+            return
+        data = {}
+        for auth0user in auth0users:
+            fields = auth0user.as_dict()
+            data[auth0user.user_id] = json.dumps(
+                dict((key, fields[key]) for key in self.fields if key in fields),
+                cls=DjangoJSONEncoder)
+        using = router.db_for_write(self.model)
+        try:
+            with transaction.atomic(using=using):
+                self._store(data, using)
+        except DatabaseError:
+            logger.error("Could not store profile snapshots", exc_info=True)
+
+    def _store(self, data, using):
+        manager = self.db_manager(using)
+        missing = [
+            auth0_id for auth0_id, value in data.items()
+            if not manager.filter(auth0_id=auth0_id).update(data=value, modified=timezone.now())]
+        try:
+            with transaction.atomic(using=using):
+                manager.bulk_create([
+                    self.model(auth0_id=auth0_id, data=data[auth0_id]) for auth0_id in missing])
+        except IntegrityError:
+            # inserted concurrently since the update, so update those one at a time
+            for auth0_id in missing:
+                manager.update_or_create(auth0_id=auth0_id, defaults={'data': data[auth0_id]})
+
+    def get_auth0users(self, auth0_ids):
+        """
+        Return a dict of auth0_id to Auth0 users rebuilt from their last snapshots
+        """
+        if not self.enabled():
+            return {}
+        Auth0User = Profile._Auth0User
+        auth0users = {}
+        for snapshot in self.filter(auth0_id__in=auth0_ids):
+            auth0user = Auth0User(**json.loads(snapshot.data))
+            # only send fields changed since the snapshot if it is saved
+            auth0user._fetched = True
+            auth0user._original = auth0user.as_dict(updatable_only=True)
+            auth0users[snapshot.auth0_id] = auth0user
+        return auth0users
+
+
+class ProfileSnapshot(models.Model):
+
+    """
+    The last known profile of an Auth0 user, used when Auth0 can't be reached.
+    """
+
+    auth0_id = models.CharField(_('auth0 user id'), max_length=36, unique=True)
+    data = models.TextField(_('data'))
+    modified = AutoLastModifiedField(_('modified'))
+
+    objects = ProfileSnapshotManager()
+
+    class Meta:
+        verbose_name = _('profile snapshot')
+        verbose_name_plural = _('profile snapshots')
+
+    def __str__(self):
+        return self.auth0_id
 
 
 class SiteUserManager(BaseUserManager):
 
     """ Custom manager for User."""
 
-    _Auth0User = Auth0(
-        settings.AUTH0_DOMAIN,
-        settings.AUTH0_JWT,
-        client_id=settings.AUTH0_CLIENT_ID,
-        default_connection=settings.AUTH0_CONNECTION).users
+    _Auth0User = ClientUsers()
+
+    @classmethod
+    def normalize_email(cls, email):
+        """
+        Lowercase the whole email, as Auth0 does, so emails match with the email index.
+        """
+        return super(SiteUserManager, cls).normalize_email(email).lower()
 
     def _create_user(self, email, password, **extra_fields):
         """ Create and save an EmailUser with the given email and password.
@@ -128,9 +595,14 @@ class SiteUserManager(BaseUserManager):
         """
         if not email:
             raise ValueError('The email must be set')
+        email = self.normalize_email(email)
         auth0user = extra_fields.pop('auth0user', None)
+        auth0_id = extra_fields.pop('auth0_id', None) or getattr(auth0user, 'user_id', None)
         email_verified = extra_fields.pop('email_verified', False)
-        if not auth0user:
+        if not auth0_id:
+            # people already on another site don't need an Auth0 search
+            auth0_id = self.get_identities([email]).get(email, (None,))[0]
+        if not auth0_id:
             auth0user, created = self._Auth0User.get_or_create(
                 defaults={
                     'email_verified': email_verified,
@@ -140,8 +612,9 @@ class SiteUserManager(BaseUserManager):
                         'family_name': extra_fields.get('last_name', '')}
                 },
                 email=email)
+            auth0_id = auth0user.user_id
 
-        user = self.model(auth0_id=auth0user.user_id, email=email, **extra_fields)
+        user = self.model(auth0_id=auth0_id, email=email, **extra_fields)
         user.set_password(password)
         user.save(using=self._db)
         return user
@@ -156,13 +629,13 @@ class SiteUserManager(BaseUserManager):
         """
         extra_fields.setdefault('is_staff', False)
         extra_fields.setdefault('is_superuser', False)
-        extra_fields.setdefault('site_id', getattr(settings, 'SITE_ID', 1))
+        extra_fields.setdefault('site_id', sites.get_current_site_id())
         return self._create_user(email, password, **extra_fields)
 
     def create_superuser(self, email, password, **extra_fields):
         extra_fields.setdefault('is_staff', True)
         extra_fields.setdefault('is_superuser', True)
-        extra_fields.setdefault('site_id', getattr(settings, 'SITE_ID', 1))
+        extra_fields.setdefault('site_id', sites.get_current_site_id())
         extra_fields.setdefault('email_verified', True)
         if extra_fields.get('is_staff') is not True:
             raise ValueError('Superuser must have is_staff=True.')
@@ -171,11 +644,312 @@ class SiteUserManager(BaseUserManager):
 
         return self._create_user(email, password, **extra_fields)
 
-    def get_by_natural_key(self, auth0_id, site_id=settings.SITE_ID):
+    def get_by_natural_key(self, auth0_id, site_id=None):
         """
         Overrides BaseUserManager to add site_id and use auth0_id
+
+        The site defaults to the site of the current request.
+        """
+        site_id = site_id or sites.get_current_site_id()
+        return self.db_for_site(site_id).get(auth0_id=auth0_id, site_id=site_id)
+
+    def db_for_site(self, site_id):
+        """
+        Return this manager on the database holding the users of a site.
+        """
+        return self.db_manager(hints={'site_id': site_id})
+
+    def shards(self):
+        """
+        Return a queryset of users for each database shard, to fan out queries across sites.
+
+        There is a single queryset unless ``settings.AUTH0_SITE_SHARDS`` is set, or if this
+        manager is already bound to a database.
+        """
+        aliases = get_shard_aliases()
+        if self._db or not aliases:
+            return [self.all()]
+        return [self.using(alias) for alias in aliases]
+
+    def get_identities(self, emails):
+        """
+        Look up people by email among the users of every site.
+
+        Returns a dict of lowercased email to a ``(auth0_id, given_name, family_name)`` tuple
+        for the emails found, so Auth0 only needs searching for people new to all sites.
         """
-        return self.get(auth0_id=auth0_id, site_id=site_id)
+        identities = {}
+        for users in self.shards():
+            users = self.filter_emails(users, emails).order_by('-modified').values_list(
+                'email', 'auth0_id', 'given_name', 'family_name')
+            for email, auth0_id, given_name, family_name in users:
+                identities.setdefault(email.lower(), (auth0_id, given_name, family_name))
+        return identities
+
+    def sync_names(self, profiles):
+        """
+        Copy profile names to the name columns of each user's rows on every site.
+
+        :param dict profiles: auth0_id to Profile
+        """
+        for auth0_id, profile in profiles.items():
+            if profile._auth0user is None:  # don't blank names when Auth0 is unavailable
+                continue
+            given_name, family_name = profile.given_name, profile.family_name
+            for users in self.shards():
+                users.filter(auth0_id=auth0_id).exclude(
+                    given_name=given_name, family_name=family_name).update(
+                        given_name=given_name, family_name=family_name)
+
+    def set_active_many(self, auth0_ids, active, block=True, chunk_size=500, workers=1,
+                        limiter=None):
+        """
+        Activate or deactivate people on every site at once, returning an ActivationResult
+        per auth0_id.
+
+        ``is_active`` is updated ``chunk_size`` ids at a time on each shard, then unless
+        ``block`` is False the Auth0 users are blocked or unblocked with up to ``workers``
+        concurrent calls waiting on ``limiter``, and their cached profiles are dropped.
+        """
+        from .backends import invalidate_token_users
+        auth0_ids = list(OrderedDict.fromkeys(auth0_ids))
+        rows = dict.fromkeys(auth0_ids, 0)
+        modified = timezone.now()
+        for chunk in chunked(auth0_ids, chunk_size):
+            for users in self.shards():
+                users = users.filter(auth0_id__in=chunk)
+                memberships = list(users.values_list('auth0_id', 'site_id'))
+                for auth0_id, site_id in memberships:
+                    rows[auth0_id] += 1
+                users.exclude(is_active=active).update(is_active=active, modified=modified)
+                # updates skip the post_save signal that drops cached token users
+                invalidate_token_users(memberships)
+        errors = {}
+        if block:
+            errors = provisioning.set_auth0_blocked(auth0_ids, not active, workers, limiter)
+        Profile.invalidate_many(auth0_ids)
+        return [
+            provisioning.ActivationResult(auth0_id, rows[auth0_id], errors.get(auth0_id))
+            for auth0_id in auth0_ids]
+
+    def clone_site(self, from_site_id, to_site_id, chunk_size=500):
+        """
+        Copy the users of one site, with their groups and permissions, to another site.
+
+        Users are read and inserted ``chunk_size`` at a time, along with their group and
+        permission rows, without calling Auth0 as the people are the same. Users already on
+        the new site are skipped. Returns the numbers of users created and skipped.
+        """
+        from .backends import invalidate_token_users
+        source = self.db_for_site(from_site_id).filter(site_id=from_site_id).order_by('pk')
+        target = self.db_for_site(to_site_id)
+        # a clone joins the new site now, so the site specific dates aren't copied
+        fields = [
+            field.attname for field in self.model._meta.concrete_fields
+            if not field.primary_key and field.attname not in (
+                'site_id', 'date_joined', 'last_login', 'created', 'modified')]
+        created = skipped = 0
+        last_pk = None
+        while True:
+            page = source if last_pk is None else source.filter(pk__gt=last_pk)
+            rows = list(page.values('pk', *fields)[:chunk_size])
+            if not rows:
+                return created, skipped
+            last_pk = rows[-1]['pk']
+            existing = set(target.filter(
+                site_id=to_site_id, auth0_id__in=[row['auth0_id'] for row in rows]).values_list(
+                    'auth0_id', flat=True))
+            new = OrderedDict(
+                (row.pop('pk'), row) for row in rows if row['auth0_id'] not in existing)
+            skipped += len(rows) - len(new)
+            created += len(new)
+            # users and their memberships are saved together, so a rerun that skips the users
+            # as existing never misses their groups and permissions
+            with transaction.atomic(using=router.db_for_write(self.model, site_id=to_site_id)):
+                self._clone_chunk(new, from_site_id, to_site_id, target)
+            # bulk inserts skip the post_save signal that drops cached token users
+            invalidate_token_users([(row['auth0_id'], to_site_id) for row in new.values()])
+
+    def get_related_ids(self, name, ids, from_db, to_db):
+        """
+        Return a dict of the ids of groups, for ``name`` 'groups', or permissions, for
+        'user_permissions', on database ``from_db`` to the ids of the same ones on ``to_db``.
+
+        Ids differ between shards, so groups are matched by name and permissions by app label,
+        model and codename. Those missing on ``to_db`` are left out.
+        """
+        ids = set(ids)
+        if from_db == to_db or not ids:
+            return dict((pk, pk) for pk in ids)
+        related = self.model._meta.get_field(name).related_model
+        if name == 'groups':
+            fields = ('name',)
+        else:
+            fields = ('codename', 'content_type__app_label', 'content_type__model')
+        keys = dict(
+            (row[1:], row[0]) for row in related._default_manager.using(from_db).filter(
+                pk__in=ids).values_list('pk', *fields))
+        targets = related._default_manager.using(to_db).filter(
+            **{'%s__in' % fields[0]: set(key[0] for key in keys)}).values_list('pk', *fields)
+        related_ids = dict((keys[row[1:]], row[0]) for row in targets if row[1:] in keys)
+        if len(related_ids) < len(ids):
+            logger.warning(
+                "%s %s of database %s are missing on database %s",
+                related._meta.verbose_name_plural, sorted(ids - set(related_ids)), from_db, to_db)
+        return related_ids
+
+    def _clone_chunk(self, new, from_site_id, to_site_id, target):
+        target.bulk_create([self.model(site_id=to_site_id, **row) for row in new.values()])
+
+        # the new primary keys, as bulk_create doesn't set them on every database
+        pks = dict(target.filter(
+            site_id=to_site_id, auth0_id__in=[row['auth0_id'] for row in new.values()]
+        ).values_list('auth0_id', 'pk'))
+        clones = dict((pk, pks[row['auth0_id']]) for pk, row in new.items())
+        for name in ('groups', 'user_permissions'):
+            field = self.model._meta.get_field(name)
+            through = field.remote_field.through
+            source_name = '%s_id' % field.m2m_field_name()
+            target_name = '%s_id' % field.m2m_reverse_field_name()
+            links = list(through._default_manager.db_manager(
+                hints={'site_id': from_site_id}).filter(
+                    **{'%s__in' % source_name: list(clones)}).values_list(
+                        source_name, target_name))
+            # the sites may be on shards with their own groups and permissions
+            related_ids = self.get_related_ids(
+                name, [related_id for user_id, related_id in links],
+                router.db_for_read(field.related_model, site_id=from_site_id),
+                router.db_for_write(field.related_model, site_id=to_site_id))
+            through._default_manager.db_manager(hints={'site_id': to_site_id}).bulk_create([
+                through(**{source_name: clones[user_id], target_name: related_ids[related_id]})
+                for user_id, related_id in links if related_id in related_ids])
+
+    def bulk_create_users(self, rows, site_id=None, chunk_size=500, workers=1, limiter=None):
+        """
+        Create users on a site from an iterable of dicts, yielding a ProvisionResult per row.
+
+        Each row needs an ``email`` and may have ``first_name``, ``last_name`` and
+        ``email_verified``. Rows are read and saved ``chunk_size`` at a time so any number of
+        rows can be streamed through. People already on Auth0 are reused, the rest are
+        created with an Auth0 bulk import job and without a password, so they will need
+        to reset it. Nothing is created until the returned iterator is consumed.
+
+        :param iterable rows: dicts of user data
+        :param int site_id: the site to add users to, defaults to the current site
+        :param int chunk_size: rows per Auth0 import job and database insert
+        :param int workers: concurrent Auth0 searches when resolving existing users
+        :param limiter: an optional ``auth0user.utils.RateLimiter`` for Auth0 searches
+        """
+        site_id = site_id or sites.get_current_site_id()
+        for chunk in chunked(rows, chunk_size):
+            for result in self._bulk_create_chunk(chunk, site_id, workers, limiter):
+                yield result
+
+    def filter_emails(self, queryset, emails):
+        """
+        Filter users by email ignoring case, as Auth0 does. Emails are stored lowercased so
+        this uses the email index.
+        """
+        return queryset.filter(email__in=set(self.normalize_email(email) for email in emails))
+
+    def _bulk_create_chunk(self, rows, site_id, workers, limiter):
+        from .backends import invalidate_token_users
+        results = {}
+        pending = OrderedDict()
+        for row in rows:
+            email = self.normalize_email((row.get('email') or '').strip())
+            if not email:
+                yield provisioning.ProvisionResult(
+                    email, None, provisioning.FAILED, 'The email must be set')
+            elif email.lower() in pending:
+                yield provisioning.ProvisionResult(
+                    email, None, provisioning.FAILED, 'Duplicate email')
+            else:
+                pending[email.lower()] = dict(row, email=email)
+
+        manager = self.db_for_site(site_id)
+        existing = self.filter_emails(manager.filter(site_id=site_id), pending)
+        for email, auth0_id in existing.values_list('email', 'auth0_id'):
+            row = pending.pop(email.lower(), None)
+            if row:
+                results[email.lower()] = (row, auth0_id, provisioning.EXISTS, None)
+
+        # the auth0 id and names of each person, from other sites or else Auth0
+        identities = self.get_identities(list(pending))
+        for email, auth0user in provisioning.resolve_auth0_users(
+                [email for email in pending if email not in identities],
+                workers, limiter).items():
+            profile = Profile(auth0user)
+            identities[email] = (auth0user.user_id, profile.given_name, profile.family_name)
+        new_users = [
+            {
+                'email': row['email'],
+                'email_verified': bool(row.get('email_verified', False)),
+                'user_metadata': {
+                    'given_name': row.get('first_name') or '',
+                    'family_name': row.get('last_name') or ''},
+            }
+            for email, row in pending.items() if email not in identities]
+        if new_users:
+            imported = provisioning.import_auth0_users(new_users)
+            for email, (auth0_id, error) in imported.items():
+                if auth0_id:
+                    row = pending[email]
+                    identities[email] = (
+                        auth0_id, row.get('first_name') or '', row.get('last_name') or '')
+                else:
+                    results[email] = (pending.pop(email), None, provisioning.FAILED, error)
+
+        # people on the site under another email, or twice in the chunk, aren't added again
+        on_site = set(manager.filter(
+            site_id=site_id, auth0_id__in=[identities[email][0] for email in pending]
+        ).values_list('auth0_id', flat=True))
+        users = OrderedDict()
+        for email, row in pending.items():
+            auth0_id, given_name, family_name = identities[email]
+            if auth0_id in on_site or auth0_id in users:
+                results[email] = (row, auth0_id, provisioning.EXISTS, None)
+                continue
+            users[auth0_id] = self.model(
+                auth0_id=auth0_id, email=row['email'], site_id=site_id,
+                given_name=given_name or '', family_name=family_name or '',
+                password=make_password(None))
+            results[email] = (row, auth0_id, provisioning.CREATED, None)
+        using = self._db or router.db_for_write(self.model, site_id=site_id)
+        try:
+            with transaction.atomic(using=using):
+                manager.bulk_create(users.values())
+        except IntegrityError:
+            # added concurrently, so insert one at a time to report each row
+            for email, (row, auth0_id, status, error) in list(results.items()):
+                if status != provisioning.CREATED:
+                    continue
+                try:
+                    with transaction.atomic(using=using):
+                        manager.bulk_create([users[auth0_id]])
+                except IntegrityError as e:
+                    results[email] = (row, auth0_id, provisioning.FAILED, str(e))
+
+        # bulk inserts skip the post_save signal that drops cached token users
+        invalidate_token_users([
+            (auth0_id, site_id) for row, auth0_id, status, error in results.values()
+            if status == provisioning.CREATED])
+
+        for row, auth0_id, status, error in results.values():
+            yield provisioning.ProvisionResult(row['email'], auth0_id, status, error)
+
+
+class RequestSiteManager(CurrentSiteManager):
+
+    """
+    CurrentSiteManager limited to the site of the current request rather than settings.SITE_ID.
+    """
+
+    def get_queryset(self):
+        site_id = sites.get_current_site_id()
+        queryset = self._queryset_class(
+            model=self.model, using=self._db, hints=dict(self._hints, site_id=site_id))
+        return queryset.filter(**{self._get_field_name() + '__id': site_id})
 
 
 class SiteUser(AbstractBaseUser, PermissionsMixin):
@@ -186,6 +960,11 @@ class SiteUser(AbstractBaseUser, PermissionsMixin):
 
     auth0_id = models.CharField(_('auth0 user id'), db_index=True, max_length=36, editable=False)
     email = models.EmailField(_('email address'), db_index=True, max_length=150, editable=False)
+    # local copies of the Auth0 profile names for searching and sorting
+    given_name = models.CharField(
+        _('given name'), db_index=True, max_length=150, blank=True, editable=False)
+    family_name = models.CharField(
+        _('family name'), db_index=True, max_length=150, blank=True, editable=False)
     
     is_staff = models.BooleanField(
         _('staff status'),
@@ -200,17 +979,19 @@ class SiteUser(AbstractBaseUser, PermissionsMixin):
             'Unselect this instead of deleting accounts.'
         ),
     )
-    site = models.ForeignKey(Site, blank=True, default=settings.SITE_ID)
+    site = models.ForeignKey(Site, blank=True, default=sites.get_current_site_id)
     date_joined = models.DateTimeField(_('date joined'), default=timezone.now)
     last_login = models.DateTimeField(_('last login'), blank=True, null=True)
     created = AutoCreatedField(_('created'))
     modified = AutoLastModifiedField(_('modified'))
 
     objects = SiteUserManager()
-    on_site = CurrentSiteManager()
+    on_site = RequestSiteManager()
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = []
+    # the Auth0 user fields fetched for the profile, None fetches the complete user
+    PROFILE_FIELDS = None
 
     class Meta:
         abstract = True
@@ -231,14 +1012,40 @@ class SiteUser(AbstractBaseUser, PermissionsMixin):
 
     def save(self, *args, **kwargs):
         self.profile.save()
+        names = (self.profile.given_name, self.profile.family_name)
+        names_changed = (
+            self.profile._auth0user is not None and
+            names != (self.given_name, self.family_name))
+        if names_changed:
+            self.given_name, self.family_name = names
         super(SiteUser, self).save(*args, **kwargs)
+        if names_changed:
+            self.__class__._default_manager.sync_names({self.auth0_id: self.profile})
+
+    def sync_names(self):
+        """
+        Update the name columns of this user, on every site, from the profile. Nothing is
+        written when the names are unchanged.
+        """
+        if self.profile._auth0user is None:
+            return
+        names = (self.profile.given_name, self.profile.family_name)
+        if names == (self.given_name, self.family_name):
+            return
+        self.given_name, self.family_name = names
+        self.__class__._default_manager.sync_names({self.auth0_id: self.profile})
 
     def natural_key(self):  # also includes site_id
         return (self.get_username(), self.site_id)
 
     def set_password(self, raw_password):
         self.profile.password = raw_password
-        super(SiteUser, self).set_password(raw_password)
+        if getattr(settings, 'AUTH0_LOCAL_PASSWORD', True):
+            super(SiteUser, self).set_password(raw_password)
+        else:
+            # Auth0 owns the password so skip hashing it locally
+            self.set_unusable_password()
+            self._password = raw_password
 
     @property
     def first_name(self):
@@ -273,7 +1080,7 @@ class SiteUser(AbstractBaseUser, PermissionsMixin):
             return self._profile
         except AttributeError:
             pass
-        self._profile = Profile.get(self.auth0_id)
+        self._profile = Profile.get(self.auth0_id, fields=self.PROFILE_FIELDS)
         return self._profile
 
     def email_user(self, subject, message, from_email=None, **kwargs):
@@ -283,7 +1090,9 @@ class SiteUser(AbstractBaseUser, PermissionsMixin):
         send_mail(subject, message, from_email, [self.email], **kwargs)
 
     def change_email(self, new_email):
+        from .backends import invalidate_token_users
 
+        new_email = type(self)._default_manager.normalize_email(new_email)
         try:
             self.profile.email = new_email
             self.profile.save()
@@ -291,4 +1100,8 @@ class SiteUser(AbstractBaseUser, PermissionsMixin):
             pass
         self.email = new_email
         self.modified = timezone.now()
-        self.objects.filter(email=self.email).update(email=new_email, modified=self.modified)
+        # the user's rows on every site share the Auth0 email
+        for users in type(self)._default_manager.shards():
+            users = users.filter(auth0_id=self.auth0_id)
+            users.update(email=new_email, modified=self.modified)
+            invalidate_token_users(users.values_list('auth0_id', 'site_id'))
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Migration operations for concrete SiteUser models.
+"""
+from django.db.backends.utils import truncate_name
+from django.db.migrations.operations.base import Operation
+from django.db.models.functions import Lower
+
+
+class CreateNameSearchIndexes(Operation):
+
+    """
+    Create PostgreSQL trigram indexes so the case insensitive name and email searches used
+    by the admin can use an index. Does nothing on other databases.
+
+    Add it to a migration of your user model app::
+
+        operations = [
+            CreateNameSearchIndexes('user'),
+        ]
+    """
+
+    reversible = True
+    columns = ('given_name', 'family_name', 'email')
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+
+    def deconstruct(self):
+        return (self.__class__.__name__, [self.model_name], {})
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def _get_indexes(self, app_label, schema_editor, state):
+        model = state.apps.get_model(app_label, self.model_name)
+        table = model._meta.db_table
+        for column in self.columns:
+            yield table, column, truncate_name('%s_%s_trgm' % (table, column), 63)
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        quote_name = schema_editor.quote_name
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for table, column, name in self._get_indexes(app_label, schema_editor, to_state):
+            schema_editor.execute(
+                'CREATE INDEX %s ON %s USING gin (UPPER(%s::text) gin_trgm_ops)' % (
+                    quote_name(name), quote_name(table), quote_name(column)))
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for table, column, name in self._get_indexes(app_label, schema_editor, from_state):
+            schema_editor.execute('DROP INDEX IF EXISTS %s' % schema_editor.quote_name(name))
+
+    def describe(self):
+        return "Create name search indexes on %s" % self.model_name
+
+
+class LowercaseEmails(Operation):
+
+    """
+    Lowercase the emails of existing users. New emails are saved lowercased so lookups by
+    email, which ignore case as Auth0 does, can use the email index.
+
+    Add it to a migration of your user model app::
+
+        operations = [
+            LowercaseEmails('user'),
+        ]
+    """
+
+    reversible = True
+    reduces_to_sql = False
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+
+    def deconstruct(self):
+        return (self.__class__.__name__, [self.model_name], {})
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        alias = schema_editor.connection.alias
+        if self.allow_migrate_model(alias, model):
+            model._base_manager.using(alias).exclude(email=Lower('email')).update(
+                email=Lower('email'))
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        # the original case isn't kept, lowercase emails are valid either way
+        pass
+
+    def describe(self):
+        return "Lowercase the emails of %s" % self.model_name
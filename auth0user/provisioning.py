@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Helpers for creating many Auth0 users and local site users at once.
+"""
+import gzip
+import io
+import json
+import logging
+import time
+import uuid
+from collections import namedtuple
+
+from auth0plus.exceptions import Auth0Error
+
+from .clients import get_client
+from .utils import chunked, concurrent_map
+
+logger = logging.getLogger(__name__)
+
+CREATED = 'created'
+EXISTS = 'exists'
+FAILED = 'failed'
+
+ProvisionResult = namedtuple('ProvisionResult', ['email', 'auth0_id', 'status', 'error'])
+# the number of site user rows of an Auth0 user updated and any error blocking it on Auth0
+ActivationResult = namedtuple('ActivationResult', ['auth0_id', 'rows', 'error'])
+
+JOB_POLL_INTERVAL = 2
+JOB_TIMEOUT = 600
+
+
+def resolve_auth0_users(emails, workers=1, limiter=None):
+    """
+    Return a dict of lowercased email to Auth0 user for the emails that exist on Auth0.
+    """
+    client = get_client()
+
+    def search(batch):
+        return client.get_users_by_email(batch)
+
+    resolved = {}
+    batches = chunked(emails, client.search_batch_size)
+    for users in concurrent_map(search, batches, workers, limiter):
+        for user in users:
+            resolved[user.email.lower()] = user
+    return resolved
+
+
+def set_auth0_blocked(auth0_ids, blocked, workers=1, limiter=None):
+    """
+    Block or unblock many Auth0 users and return a dict of auth0_id to an error message, or
+    None where it succeeded.
+    """
+    client = get_client()
+
+    def set_blocked(auth0_id):
+        try:
+            client.set_blocked(auth0_id, blocked)
+        except Auth0Error as e:
+            logger.error("Could not set Auth0 user %s blocked", auth0_id, exc_info=True)
+            return str(e)
+
+    return dict(zip(auth0_ids, concurrent_map(set_blocked, auth0_ids, workers, limiter)))
+
+
+def wait_for_job(job, interval=JOB_POLL_INTERVAL, timeout=JOB_TIMEOUT):
+    """
+    Poll an Auth0 job until it has completed or failed and return the final job dict.
+    """
+    client = get_client()
+    deadline = time.time() + timeout
+    while True:
+        job = client.get_job(job['id'])
+        if job['status'] not in ('pending', 'processing'):
+            return job
+        if time.time() > deadline:
+            raise Auth0Error(
+                status_code=408, error_code='job_timeout',
+                message='Job %s did not finish within %s seconds' % (job['id'], timeout))
+        time.sleep(interval)
+
+
+def import_auth0_users(users, interval=JOB_POLL_INTERVAL, timeout=JOB_TIMEOUT):
+    """
+    Create Auth0 users from a list of user dicts with one bulk import job.
+
+    Each user is given its own id so the job results can be mapped back without a search.
+    Returns a dict of lowercased email to either ``('auth0_id', None)`` on success or
+    ``(None, 'error message')`` on failure.
+    """
+    client = get_client()
+    user_ids = {}
+    for user in users:
+        user['user_id'] = uuid.uuid4().hex[:24]
+        user_ids[user['email'].lower()] = client.get_imported_user_id(user['user_id'])
+    try:
+        job = wait_for_job(client.import_users(users), interval, timeout)
+        errors = client.get_job_errors(job['id']) if job['status'] == 'completed' else []
+    except Auth0Error as e:
+        logger.error("Auth0 user import failed", exc_info=True)
+        return dict((email, (None, str(e))) for email in user_ids)
+    if job['status'] != 'completed':
+        message = 'Import job %s' % job['status']
+        return dict((email, (None, message)) for email in user_ids)
+    results = dict((email, (auth0_id, None)) for email, auth0_id in user_ids.items())
+    for error in errors:
+        message = '; '.join(e.get('message', e.get('code', '')) for e in error.get('errors', []))
+        results[error['user']['email'].lower()] = (None, message)
+    return results
+
+
+def load_auth0_export(path):
+    """
+    Return a dict of lowercased email to Auth0 user id from an Auth0 users export job file,
+    newline delimited JSON with ``email`` and ``user_id`` fields, optionally gzipped.
+    """
+    opener = gzip.open if path.endswith('.gz') else io.open
+    user_ids = {}
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            user = json.loads(line)
+            if user.get('email') and user.get('user_id'):
+                user_ids[user['email'].lower()] = user['user_id']
+    return user_ids
@@ -0,0 +1,40 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .claims import store_claims
+from .models import SiteUser
+
+
+def sync_names(sender, request, user, **kwargs):
+    """
+    Refresh the local name columns from the profile when a site user logs in.
+    """
+    if isinstance(user, SiteUser):
+        user.sync_names()
+
+
+def store_login_claims(sender, request, user, **kwargs):
+    """
+    Keep the profile claims of a site user in the session they logged in with.
+    """
+    if isinstance(user, SiteUser) and getattr(request, 'session', None) is not None:
+        store_claims(request, user)
+
+
+def update_last_login(sender, user, **kwargs):
+    """
+    Replaces django.contrib.auth.models.update_last_login with a queryset update, so logging in
+    never runs SiteUser.save and the profile save. The write is skipped if the stored value is
+    less than ``settings.AUTH0_LAST_LOGIN_INTERVAL`` seconds old.
+    """
+    now = timezone.now()
+    threshold = now - timedelta(seconds=getattr(settings, 'AUTH0_LAST_LOGIN_INTERVAL', 0))
+    if user.last_login and user.last_login > threshold:
+        return
+    user.__class__._default_manager.db_for_site(user.site_id).filter(
+        Q(last_login__isnull=True) | Q(last_login__lte=threshold), pk=user.pk).update(
+            last_login=now)
+    user.last_login = now
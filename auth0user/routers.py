@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+Database routers for site users.
+"""
+import random
+import threading
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS
+
+from . import sites
+
+REPLICA_PIN_COOKIE = 'auth0user_pin'
+REPLICA_PIN_SECONDS_DEFAULT = 5
+
+# whether the current request reads users from the primary database
+_pinned = threading.local()
+
+
+def get_shard_aliases():
+    """
+    Return the database aliases of ``settings.AUTH0_SITE_SHARDS`` in a stable order, or an
+    empty list when site users aren't sharded.
+    """
+    shards = getattr(settings, 'AUTH0_SITE_SHARDS', None)
+    if not shards:
+        return []
+    if isinstance(shards, dict):
+        # unlisted sites are on the default database
+        return sorted(set(shards.values()) | set([DEFAULT_DB_ALIAS]))
+    return sorted(set(shards))
+
+
+def get_site_shard(site_id):
+    """
+    Return the database alias holding the users of a site.
+
+    ``settings.AUTH0_SITE_SHARDS`` is either a dict of site id to alias, where unlisted sites
+    use the default database, or a list of aliases the site ids are hashed over.
+    """
+    shards = settings.AUTH0_SITE_SHARDS
+    if isinstance(shards, dict):
+        return shards.get(int(site_id), DEFAULT_DB_ALIAS)
+    return shards[int(site_id) % len(shards)]
+
+
+_sharded_tables = set()
+
+
+def get_sharded_tables():
+    """
+    Return the tables kept on each site's shard: the user table, its group and permission
+    tables, and the groups and permissions they join against.
+    """
+    if _sharded_tables:
+        return _sharded_tables
+    User = get_user_model()
+    Group = apps.get_model('auth', 'Group')
+    tables = set()
+    for model in (User, Group):
+        tables.add(model._meta.db_table)
+        tables.update(
+            field.remote_field.through._meta.db_table
+            for field in model._meta.local_many_to_many)
+        tables.update(
+            field.related_model._meta.db_table for field in model._meta.local_many_to_many)
+    _sharded_tables.update(tables)
+    return _sharded_tables
+
+
+class SiteShardRouter(object):
+
+    """
+    Keeps each site's users, with their groups and permissions, on the database given by
+    ``settings.AUTH0_SITE_SHARDS``.
+
+    The site comes from a ``site_id`` hint (``User.objects.db_for_site(site_id)``), the user
+    instance, or else the current site. Queries across sites use ``User.objects.shards()``.
+    """
+
+    def is_sharded(self, model):
+        return bool(get_shard_aliases()) and model._meta.db_table in get_sharded_tables()
+
+    def db_for_site(self, model, **hints):
+        if not self.is_sharded(model):
+            return None
+        site_id = hints.get('site_id')
+        instance = hints.get('instance')
+        if not site_id and instance is not None and self.is_sharded(type(instance)):
+            site_id = getattr(instance, 'site_id', None)
+            if not site_id and instance._state.db:
+                return instance._state.db
+        return get_site_shard(site_id or sites.get_current_site_id())
+
+    db_for_read = db_for_site
+    db_for_write = db_for_site
+
+    def allow_relation(self, obj1, obj2, **hints):
+        sharded = self.is_sharded(type(obj1)), self.is_sharded(type(obj2))
+        if all(sharded):
+            return obj1._state.db == obj2._state.db
+        if any(sharded):
+            # sites and content types are the same on every shard
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        model = hints.get('model')
+        if model is None or not get_shard_aliases():
+            return None
+        if model._meta.db_table in get_sharded_tables():
+            return db in get_shard_aliases()
+        return None
+
+
+def get_replicas(alias):
+    """
+    Return the replica aliases of a primary database from ``settings.AUTH0_REPLICA_DATABASES``,
+    a dict of primary alias to a list of replica aliases.
+    """
+    return getattr(settings, 'AUTH0_REPLICA_DATABASES', {}).get(alias, [])
+
+
+def get_primary(alias):
+    for primary, replicas in getattr(settings, 'AUTH0_REPLICA_DATABASES', {}).items():
+        if alias in replicas:
+            return primary
+    return alias
+
+
+def pin(written=False):
+    """
+    Read users from the primary database for the rest of the request.
+    """
+    _pinned.pinned = True
+    _pinned.written = _pinned.__dict__.get('written', False) or written
+
+
+def is_pinned():
+    return _pinned.__dict__.get('pinned', False)
+
+
+def has_written():
+    return _pinned.__dict__.get('written', False)
+
+
+def unpin():
+    _pinned.__dict__.clear()
+
+
+def pin_request(request):
+    if request.COOKIES.get(REPLICA_PIN_COOKIE):
+        pin()
+
+
+def set_pin_cookie(response):
+    """
+    Keep reading from the primary for ``settings.AUTH0_REPLICA_PIN_SECONDS`` after a request
+    that wrote users, so the next requests don't see a lagging replica.
+    """
+    if has_written() and getattr(settings, 'AUTH0_REPLICA_DATABASES', None):
+        response.set_cookie(
+            REPLICA_PIN_COOKIE, '1', httponly=True,
+            max_age=getattr(settings, 'AUTH0_REPLICA_PIN_SECONDS', REPLICA_PIN_SECONDS_DEFAULT))
+
+
+class ReplicaRouter(SiteShardRouter):
+
+    """
+    Reads users, groups and permissions from a replica of their database, as given by
+    ``settings.AUTH0_REPLICA_DATABASES``, until the request writes any of them.
+
+    Sites are sharded as well when ``settings.AUTH0_SITE_SHARDS`` is set.
+    """
+
+    def get_primary_db(self, model, hints):
+        alias = super(ReplicaRouter, self).db_for_site(model, **hints)
+        if alias is None:
+            instance = hints.get('instance')
+            alias = getattr(getattr(instance, '_state', None), 'db', None) or DEFAULT_DB_ALIAS
+        return get_primary(alias)
+
+    def db_for_read(self, model, **hints):
+        if model._meta.db_table not in get_sharded_tables():
+            return None
+        primary = self.get_primary_db(model, hints)
+        replicas = get_replicas(primary)
+        if is_pinned() or not replicas:
+            return primary
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        if model._meta.db_table not in get_sharded_tables():
+            return None
+        pin(written=True)
+        return self.get_primary_db(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        tables = get_sharded_tables()
+        if obj1._meta.db_table in tables and obj2._meta.db_table in tables:
+            return get_primary(obj1._state.db) == get_primary(obj2._state.db)
+        return super(ReplicaRouter, self).allow_relation(obj1, obj2, **hints)
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if get_primary(db) != db:
+            # replicas copy their primary
+            return False
+        return super(ReplicaRouter, self).allow_migrate(db, app_label, model_name, **hints)
@@ -0,0 +1,4 @@
+from django.dispatch import Signal
+
+# sent by Profile.save once Auth0 has been updated
+profile_saved = Signal(providing_args=['profile'])
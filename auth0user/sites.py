@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+The site users are looked up and created on, following the current request so one process
+can serve every site.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.sites.models import Site
+from django.db.models import Q
+
+# seconds before the host map is loaded again, and before an unknown host is looked up again
+HOSTS_CACHE_DEFAULT = 60
+HOST_MISS_CACHE_DEFAULT = 5
+MAX_HOST_MISSES = 1000
+
+# the site id of the current request
+_current = threading.local()
+# lowercased domain to site id, cleared when a site is saved or deleted
+_hosts = {}
+# when the host map was loaded
+_loaded = {'time': 0}
+# unknown hosts to when they were last looked up
+_misses = {}
+
+
+def _load_hosts():
+    _hosts.clear()
+    _misses.clear()
+    _hosts.update(
+        (domain.lower(), site_id)
+        for domain, site_id in Site.objects.values_list('domain', 'id'))
+    _loaded['time'] = time.time()
+
+
+def get_host_site_id(host):
+    """
+    Return the id of the site with the given domain, with or without its port, or None.
+
+    Domains are kept in the process for ``settings.AUTH0_SITE_HOSTS_CACHE`` seconds. An
+    unknown host is looked up again, as another process may have added its site, at most
+    every ``settings.AUTH0_SITE_HOST_MISS_CACHE`` seconds.
+    """
+    now = time.time()
+    if not _hosts or now - _loaded['time'] > getattr(
+            settings, 'AUTH0_SITE_HOSTS_CACHE', HOSTS_CACHE_DEFAULT):
+        _load_hosts()
+    host = host.lower()
+    names = [host, host.rsplit(':', 1)[0]]
+    for name in names:
+        if name in _hosts:
+            return _hosts[name]
+    if now - _misses.get(host, 0) < getattr(
+            settings, 'AUTH0_SITE_HOST_MISS_CACHE', HOST_MISS_CACHE_DEFAULT):
+        return None
+    found = Site.objects.filter(
+        Q(domain__iexact=names[0]) | Q(domain__iexact=names[1])).values_list('domain', 'id')
+    _hosts.update((domain.lower(), site_id) for domain, site_id in found)
+    for name in names:
+        if name in _hosts:
+            return _hosts[name]
+    if len(_misses) >= MAX_HOST_MISSES:
+        _misses.clear()
+    _misses[host] = now
+    return None
+
+
+def get_request_site_id(request):
+    """
+    Return the site id of a request from its host, falling back to ``request.site`` as set by
+    ``CurrentSiteMiddleware`` and then ``settings.SITE_ID``.
+    """
+    site_id = get_host_site_id(request.get_host())
+    if site_id:
+        return site_id
+    site = getattr(request, 'site', None)
+    if isinstance(site, Site):
+        return site.id
+    return get_default_site_id()
+
+
+def get_default_site_id():
+    return getattr(settings, 'SITE_ID', 1)
+
+
+def get_current_site_id():
+    """
+    Return the site id of the current request, or ``settings.SITE_ID`` outside a request.
+    """
+    return getattr(_current, 'site_id', None) or get_default_site_id()
+
+
+def set_current_site_id(site_id):
+    _current.site_id = site_id
+
+
+def clear_current_site_id():
+    _current.__dict__.pop('site_id', None)
+
+
+@contextmanager
+def current_site(site_id):
+    """
+    Use ``site_id`` as the current site within the block, eg. in management commands.
+    """
+    previous = getattr(_current, 'site_id', None)
+    set_current_site_id(site_id)
+    try:
+        yield
+    finally:
+        set_current_site_id(previous)
+
+
+def clear_host_cache(sender, **kwargs):
+    _hosts.clear()
+    _misses.clear()
@@ -5,4 +5,5 @@ from . import views
 app_name = 'auth0user'
 urlpatterns = [
     url(r'^alogin/', views.alogin, name='alogin'),
+    url(r'^events/$', views.events, name='events'),
 ]
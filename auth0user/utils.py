@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+import random
+import threading
+import time
+from collections import deque
+from itertools import islice
+
+import requests
+from auth0plus.exceptions import Auth0Error
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+except ImportError:  # pragma: no cover, Python 2 without the futures backport
+    ThreadPoolExecutor = None
+
+try:
+    from time import monotonic
+except ImportError:  # pragma: no cover, Python 2
+    from time import time as monotonic
+
+# errors of a failed Auth0 call, including the ValueError of a non-JSON error page
+AUTH0_ERRORS = (Auth0Error, requests.RequestException, ValueError)
+
+ASYNC_WORKERS_DEFAULT = 10
+HEDGE_WORKERS_DEFAULT = 10
+
+# thread pools by the setting that sizes them
+_executors = {}
+# free workers of each pool, for calls that must not queue
+_slots = {}
+_executor_lock = threading.Lock()
+
+
+def chunked(iterable, size):
+    """
+    Yield lists of up to ``size`` items from ``iterable`` without materializing it.
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class RateLimiter(object):
+
+    """
+    Blocking token bucket allowing on average ``rate`` calls per second.
+
+    Shared between threads so a pool of workers stays within one budget.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.burst = burst
+        self._tokens = burst
+        self._updated = monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            while True:
+                now = monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                time.sleep((1 - self._tokens) / self.rate)
+
+
+def concurrent_map(func, items, workers=1, limiter=None):
+    """
+    Apply ``func`` to each item using up to ``workers`` threads and return the results
+    in order. Each call first waits on ``limiter`` if one is given.
+    """
+    def call(item):
+        if limiter:
+            limiter.acquire()
+        return func(item)
+
+    items = list(items)
+    if workers <= 1 or len(items) <= 1 or ThreadPoolExecutor is None:
+        return [call(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(workers, len(items))) as executor:
+        return list(executor.map(call, items))
+
+
+def get_executor(setting, default):
+    """
+    Return the shared thread pool sized by ``setting``.
+    """
+    if ThreadPoolExecutor is None:
+        raise ImproperlyConfigured('Thread pools require concurrent.futures, pip install futures')
+    with _executor_lock:
+        if setting not in _executors:
+            workers = getattr(settings, setting, default)
+            _executors[setting] = ThreadPoolExecutor(max_workers=workers)
+            _slots[setting] = threading.BoundedSemaphore(workers)
+        return _executors[setting]
+
+
+def submit_if_idle(setting, default, func, *args):
+    """
+    Run ``func`` on the pool of ``setting`` if one of its workers is free and return the future,
+    or return None rather than queueing behind busy workers.
+    """
+    executor = get_executor(setting, default)
+    slots = _slots[setting]
+    if not slots.acquire(blocking=False):
+        return None
+
+    def call():
+        try:
+            return func(*args)
+        finally:
+            slots.release()
+    return executor.submit(call)
+
+
+class LatencyStats(object):
+
+    """
+    Thread-safe record of the latencies of recent calls and counts of retries, hedges and errors.
+    """
+
+    def __init__(self, window=1000):
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.counts = dict.fromkeys(
+            ('calls', 'errors', 'retries', 'hedges', 'hedge_wins', 'hedges_skipped', 'deadlines'),
+            0)
+
+    def add(self, seconds):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def incr(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def percentile(self, percent):
+        """
+        Return the given percentile of recent latencies in seconds, or None without any.
+        """
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * percent / 100.0))]
+
+    def __len__(self):
+        return len(self._latencies)
+
+    def summary(self):
+        summary = dict(self.counts)
+        for percent in (50, 95, 99):
+            summary['p%s' % percent] = self.percentile(percent)
+        return summary
+
+
+def is_retryable(error):
+    """
+    Rate limits, server errors and network failures are worth retrying, not client errors.
+    """
+    if isinstance(error, Auth0Error):
+        return error.status_code == 429 or error.status_code >= 500
+    return True
+
+
+class CallPolicy(object):
+
+    """
+    Runs an idempotent Auth0 call with bounded retries of 429, 5xx and network errors, an
+    optional hedged second request and a total deadline, recording each attempt in ``stats``.
+
+    Hedging starts a second request when the first hasn't answered within the ``percentile``
+    latency of recent calls, or ``hedge_delay`` seconds until there are ``min_samples``, and
+    takes whichever answers first. The deadline stops retries and hedged waits, and
+    ``Auth0Client`` also uses it as the HTTP timeout since a lone request can't be interrupted.
+
+    Both requests run on the bounded ``AUTH0_HEDGE_WORKERS`` pool without queueing. When every
+    worker is busy the first request runs inline without a hedge, and when only the first gets
+    a worker the hedge is skipped, so a slowdown never starts more threads or queues reads
+    behind hung requests.
+    """
+
+    def __init__(self, stats, hedge=False, percentile=95, hedge_delay=0.5, min_samples=20,
+                 retries=0, backoff=0.1, deadline=None):
+        self.stats = stats
+        self.hedge = hedge
+        self.percentile = percentile
+        self.hedge_delay = hedge_delay
+        self.min_samples = min_samples
+        self.retries = retries
+        self.backoff = backoff
+        self.deadline = deadline
+
+    def get_hedge_delay(self):
+        if len(self.stats) < self.min_samples:
+            return self.hedge_delay
+        return self.stats.percentile(self.percentile)
+
+    def _timed(self, func):
+        start = monotonic()
+        try:
+            return func()
+        finally:
+            self.stats.add(monotonic() - start)
+
+    def _remaining(self, end):
+        return None if end is None else max(0, end - monotonic())
+
+    def _deadline_error(self):
+        self.stats.incr('deadlines')
+        return Auth0Error(
+            status_code=504, error_code='deadline_exceeded',
+            message='No answer within %s seconds' % self.deadline)
+
+    def _hedged(self, func, end):
+        first = submit_if_idle(
+            'AUTH0_HEDGE_WORKERS', HEDGE_WORKERS_DEFAULT, self._timed, func)
+        if first is None:
+            self.stats.incr('hedges_skipped')
+            return self._timed(func)
+        delay = self.get_hedge_delay()
+        remaining = self._remaining(end)
+        done, pending = wait([first], timeout=delay if end is None else min(delay, remaining))
+        if done:
+            return first.result()
+        second = submit_if_idle(
+            'AUTH0_HEDGE_WORKERS', HEDGE_WORKERS_DEFAULT, self._timed, func)
+        if second is None:
+            self.stats.incr('hedges_skipped')
+            pending = set([first])
+        else:
+            self.stats.incr('hedges')
+            pending = set([first, second])
+        error = None
+        while pending:
+            done, pending = wait(pending, self._remaining(end), return_when=FIRST_COMPLETED)
+            if not done:
+                raise self._deadline_error()
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        self.stats.incr('hedge_wins')
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def __call__(self, func):
+        self.stats.incr('calls')
+        end = None if self.deadline is None else monotonic() + self.deadline
+        attempt = 0
+        while True:
+            try:
+                if self.hedge and ThreadPoolExecutor is not None:
+                    return self._hedged(func, end)
+                return self._timed(func)
+            except AUTH0_ERRORS as e:
+                self.stats.incr('errors')
+                if not is_retryable(e) or attempt >= self.retries:
+                    raise
+                pause = self.backoff * 2 ** attempt * (1 + random.random())
+                if end is not None and monotonic() + pause >= end:
+                    raise
+                attempt += 1
+                self.stats.incr('retries')
+                time.sleep(pause)
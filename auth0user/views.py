@@ -1,13 +1,23 @@
 import json
 
-import requests
+from auth0plus.exceptions import Auth0Error
 
 from django.conf import settings
 from django.contrib.auth import _get_backends, get_user_model, login
 from django.contrib.auth.views import redirect_to_login
 from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponseBadRequest, JsonResponse
 from django.shortcuts import redirect
 from django.urls import reverse
+from django.utils.crypto import constant_time_compare
+from django.utils.six.moves.urllib.parse import unquote
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from .clients import get_client
+from .models import Profile
+
+USERS_PATH = '/api/v2/users/'
 
 
 def authenticate(auth0_id):
@@ -39,22 +49,14 @@ def alogin(request):
     elif request.user.is_authenticated():
         return redirect(redirect_next)
 
-    json_header = {'content-type': 'application/json'}
-    token_url = "https://{domain}/oauth/token".format(domain=settings.AUTH0_DOMAIN)
+    client = get_client()
     redirect_path = reverse('auth0user:alogin', current_app=request.resolver_match.namespace)
-    token_payload = {
-        'client_id': settings.AUTH0_CLIENT_ID,
-        'client_secret': settings.AUTH0_CLIENT_SECRET,
-        'redirect_uri': ''.join([request.auth0.get('redirect_host'), redirect_path]),
-        'code': code,
-        'grant_type': 'authorization_code'
-    }
-    token_info = requests.post(
-        token_url, data=json.dumps(token_payload), headers=json_header).json()
-
-    user_url = "https://{domain}/userinfo?access_token={access_token}".format(
-        domain=settings.AUTH0_DOMAIN, access_token=token_info['access_token'])
-    user_info = requests.get(user_url).json()
+    try:
+        token_info = client.exchange_code(
+            code, ''.join([request.auth0.get('redirect_host'), redirect_path]))
+        user_info = client.get_userinfo(token_info['access_token'])
+    except Auth0Error:
+        raise PermissionDenied
 
     # log the user in...
     user = authenticate(user_info.get('user_id', None))
@@ -62,3 +64,52 @@ def alogin(request):
         login(request, user)
         return redirect(redirect_next)
     raise PermissionDenied
+
+
+def get_event_user_ids(events):
+    """
+    Return the auth0 ids affected by a batch of Auth0 log stream or Action events.
+
+    :raise ValueError: the batch is not a JSON object or array of events
+    """
+    if isinstance(events, dict):
+        events = events.get('logs', events.get('events', [events]))
+    if not isinstance(events, list):
+        raise ValueError('Expected a JSON object or array of events')
+    user_ids = set()
+    for event in events:
+        if not isinstance(event, dict):
+            continue
+        data = event.get('data', event)
+        if data.get('user_id'):
+            user_ids.add(data['user_id'])
+        # Management API calls are logged against the caller, the target is in the path
+        path = ((data.get('details') or {}).get('request') or {}).get('path', '')
+        if path.startswith(USERS_PATH):
+            user_ids.add(unquote(path[len(USERS_PATH):].split('/')[0]))
+    return user_ids
+
+
+@csrf_exempt
+@require_POST
+def events(request):
+    """
+    Refresh the cached profiles, snapshots and name columns of users named in Auth0 events.
+
+    Requests must carry ``Authorization: Bearer <settings.AUTH0_EVENTS_TOKEN>``. With
+    ``settings.AUTH0_EVENTS_REFRESH`` False the cached profiles are only dropped, and snapshots
+    and name columns stay as they are until the next full fetch or login.
+    """
+    token = getattr(settings, 'AUTH0_EVENTS_TOKEN', None)
+    if not token:
+        raise Http404
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    if not constant_time_compare(authorization, 'Bearer %s' % token):
+        raise PermissionDenied
+    try:
+        user_ids = get_event_user_ids(json.loads(request.body.decode('utf-8')))
+    except (ValueError, AttributeError, TypeError):
+        return HttpResponseBadRequest()
+    Profile.invalidate_many(
+        list(user_ids), refresh=getattr(settings, 'AUTH0_EVENTS_REFRESH', True))
+    return JsonResponse({'invalidated': len(user_ids)})
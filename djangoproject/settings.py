@@ -22,6 +22,10 @@ AUTH0_CLIENT_ID = os.getenv('AUTH0_CLIENT_ID')
 AUTH0_CLIENT_SECRET = os.getenv('AUTH0_CLIENT_SECRET')
 AUTH0_CONNECTION = os.getenv('AUTH0_CONNECTION')
 AUTH0_JWT = os.getenv('AUTH0_JWT')
+# Without an Auth0 tenant configured users are kept in memory
+AUTH0_CLIENT = os.getenv(
+    'AUTH0_CLIENT',
+    'auth0user.clients.Auth0Client' if AUTH0_DOMAIN else 'auth0user.clients.InMemoryClient')
 # ADMIN_SITE_NAME = 'admin'  # default
 # ADMIN_SITE_PATH = 'admin'  # default
 
@@ -98,7 +102,12 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+    },
+    # a second site user shard for the router tests
+    'shard1': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'shard1.sqlite3'),
+    },
 }
 
 
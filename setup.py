@@ -55,8 +55,12 @@ setup(
     install_requires=[
         "django-model-utils>=2.0",
         "requests",
-        "auth0plus"
+        "auth0plus",
+        "futures; python_version < '3'"
     ],
+    extras_require={
+        'jwt': ['PyJWT[crypto]>=1.5'],
+    },
     license="BSD",
     zip_safe=False,
     keywords='django-auth0user',
@@ -74,5 +78,6 @@ setup(
         'Programming Language :: Python :: 3.3',
         'Programming Language :: Python :: 3.4',
         'Programming Language :: Python :: 3.5',
+        'Programming Language :: Python :: 3.6',
     ],
 )
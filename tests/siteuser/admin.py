@@ -0,0 +1,7 @@
+from django.contrib import admin
+
+from auth0user.admin import SiteUserAdmin
+
+from .models import User
+
+admin.site.register(User, SiteUserAdmin)
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 11:15
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+from auth0user.operations import CreateNameSearchIndexes
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('siteuser', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='family_name',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=150, verbose_name='family name'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='given_name',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=150, verbose_name='given name'),
+        ),
+        CreateNameSearchIndexes('user'),
+    ]
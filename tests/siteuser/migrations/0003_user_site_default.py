@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 11:19
+from __future__ import unicode_literals
+
+import auth0user.models
+import auth0user.sites
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.manager
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('siteuser', '0002_user_names'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', django.db.models.manager.Manager()),
+                ('on_site', auth0user.models.RequestSiteManager()),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='site',
+            field=models.ForeignKey(blank=True, default=auth0user.sites.get_current_site_id, on_delete=django.db.models.deletion.CASCADE, to='sites.Site'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+from auth0user.operations import LowercaseEmails
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('siteuser', '0003_user_site_default'),
+    ]
+
+    operations = [
+        LowercaseEmails('user'),
+    ]
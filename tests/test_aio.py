@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_django-auth0user
+------------
+
+Tests for `django-auth0user` aio module.
+"""
+
+import sys
+from unittest import skipIf
+
+import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from auth0user import routers, sites
+from auth0user.clients import get_client
+from auth0user.models import Profile, identity_map
+
+if sys.version_info >= (3, 5):
+    import asyncio
+    from auth0user import aio
+
+
+@skipIf(sys.version_info < (3, 5), 'auth0user.aio needs Python 3.5 or later')
+@override_settings(AUTH0_CLIENT='auth0user.clients.InMemoryClient')
+class TestAio(TestCase):
+
+    def setUp(self):
+        get_client().clear()
+        cache.clear()
+        self.User = get_user_model()
+
+    def run_async(self, coroutine):
+        return asyncio.get_event_loop().run_until_complete(coroutine)
+
+    def test_async_profile(self):
+        user = self.User.objects.create_user('jane@example.com', 'secret', first_name='Jane')
+        cache.clear()
+        profile, many = self.run_async(asyncio.gather(
+            aio.get_user_profile(user), aio.get_profiles([user.auth0_id, 'auth0|missing'])))
+        self.assertEqual(profile.given_name, 'Jane')
+        self.assertEqual(many['auth0|missing'].email, '')
+        profile.given_name = 'Janet'
+        self.run_async(aio.save_profile(profile))
+        cache.clear()
+        self.assertEqual(self.run_async(aio.get_profile(user.auth0_id)).given_name, 'Janet')
+
+    def test_identity_map(self):
+        user = self.User.objects.create_user('jane@example.com', 'secret')
+        with identity_map():
+            profile = Profile.get(user.auth0_id)
+            self.assertIs(self.run_async(aio.get_profile(user.auth0_id)), profile)
+
+    def test_context(self):
+        def context():
+            return sites.get_current_site_id(), routers.is_pinned()
+
+        with mock.patch('auth0user.aio.close_old_connections') as close_old_connections:
+            with sites.current_site(2):
+                self.assertEqual(self.run_async(aio.run_async(context)), (2, False))
+                routers.pin()
+                self.addCleanup(routers.unpin)
+                self.assertEqual(self.run_async(aio.run_async(context)), (2, True))
+        # before and after each call, as for a request
+        self.assertEqual(close_old_connections.call_count, 4)
+        # the pool thread is left without a site or pinning
+        routers.unpin()
+        self.assertEqual(
+            self.run_async(aio.run_async(context)), (sites.get_default_site_id(), False))
+
+    def test_writes_pin_the_caller(self):
+        self.addCleanup(routers.unpin)
+        self.run_async(aio.run_async(routers.pin, written=True))
+        self.assertTrue(routers.has_written())
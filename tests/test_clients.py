@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_django-auth0user
+------------
+
+Tests for `django-auth0user` clients module.
+"""
+
+from auth0plus.exceptions import Auth0Error
+from auth0plus.settings import TIMEOUT
+
+from django.test import TestCase, override_settings
+
+from auth0user.clients import Auth0Client, get_client, InMemoryClient
+
+
+@override_settings(AUTH0_CLIENT='auth0user.clients.InMemoryClient')
+class TestInMemoryClient(TestCase):
+
+    def setUp(self):
+        self.client = get_client()
+        self.client.clear()
+
+    def test_get_client(self):
+        self.assertIsInstance(self.client, InMemoryClient)
+        self.assertIs(self.client, get_client())
+
+    def test_get_or_create(self):
+        user, created = self.client.users.get_or_create(
+            defaults={'password': 'secret'}, email='jane@example.com')
+        self.assertTrue(created)
+        self.assertTrue(user.user_id.startswith('auth0|'))
+        same, created = self.client.users.get_or_create(
+            defaults={'password': 'secret'}, email='jane@example.com')
+        self.assertFalse(created)
+        self.assertEqual(same, user)
+
+    def test_get(self):
+        user = self.client.users.create(email='jane@example.com', password='secret')
+        self.assertEqual(self.client.users.get(user.user_id).email, 'jane@example.com')
+        self.assertEqual(self.client.users.get(email='jane@example.com'), user)
+        with self.assertRaises(self.client.users.DoesNotExist):
+            self.client.users.get('auth0|missing')
+        with self.assertRaises(self.client.users.DoesNotExist):
+            self.client.users.get(email='john@example.com')
+
+    def test_save(self):
+        user = self.client.users.create(email='jane@example.com', password='secret')
+        user.user_metadata = {'given_name': 'Jane'}
+        user.save()
+        self.assertEqual(
+            self.client.users.get(user.user_id).user_metadata, {'given_name': 'Jane'})
+
+    def test_errors(self):
+        self.client.users.create(email='jane@example.com', password='secret')
+        with self.assertRaises(Auth0Error):
+            self.client.users.create(email='jane@example.com', password='secret')
+        with self.assertRaises(Auth0Error):
+            self.client.users.create(email='john@example.com')
+
+    def test_query(self):
+        jane = self.client.users.create(email='jane@example.com', password='secret')
+        john = self.client.users.create(email='john@example.com', password='secret')
+        self.client.users.create(email='jill@example.com', password='secret')
+        users = self.client.users.query(
+            q='email:("jane@example.com" OR "john@example.com")')
+        self.assertEqual(sorted(u.user_id for u in users), sorted([jane.user_id, john.user_id]))
+
+    def test_exchange_code(self):
+        user = self.client.users.create(email='jane@example.com', password='secret')
+        code = self.client.issue_code(user.user_id)
+        token_info = self.client.exchange_code(code, 'http://testserver/admin/alogin/')
+        user_info = self.client.get_userinfo(token_info['access_token'])
+        self.assertEqual(user_info['user_id'], user.user_id)
+        with self.assertRaises(Auth0Error):
+            self.client.exchange_code(code, 'http://testserver/admin/alogin/')
+
+
+@override_settings(
+    AUTH0_DOMAIN='example.auth0.com', AUTH0_JWT='token', AUTH0_CLIENT_ID='client',
+    AUTH0_CONNECTION='Username-Password-Authentication')
+class TestAuth0Client(TestCase):
+
+    def test_timeout(self):
+        self.assertEqual(Auth0Client().users._timeout, TIMEOUT)
+        # a lone request gives up by the deadline
+        with self.settings(AUTH0_DEADLINE=3):
+            self.assertEqual(Auth0Client().users._timeout, 3)
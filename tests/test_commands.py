@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_django-auth0user
+------------
+
+Tests for `django-auth0user` management commands.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+
+import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.contrib.sites.models import Site
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, models
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.utils.six import StringIO
+
+from auth0user.backends import get_token_user
+from auth0user.clients import InMemoryUser, get_client
+from auth0user.models import Profile
+from auth0user.utils import RateLimiter
+
+
+@override_settings(AUTH0_CLIENT='auth0user.clients.InMemoryClient')
+class TestWarmAuth0Profiles(TestCase):
+
+    def setUp(self):
+        get_client().clear()
+        self.User = get_user_model()
+
+    def test_warm(self):
+        users = [
+            self.User.objects.create_user('%s@example.com' % name, 'secret')
+            for name in ('jane', 'john', 'jill', 'old')]
+        self.User.objects.update(last_login=timezone.now())
+        self.User.objects.filter(email='old@example.com').update(
+            last_login=timezone.now() - timedelta(days=60))
+        cache.clear()
+        clock = [0.0]
+
+        def sleep(seconds):
+            clock[0] += seconds
+
+        acquire = RateLimiter.acquire
+        out = StringIO()
+        with mock.patch('auth0user.utils.monotonic', side_effect=lambda: clock[0]), \
+                mock.patch('auth0user.utils.time.sleep', side_effect=sleep), \
+                mock.patch.object(
+                    RateLimiter, 'acquire', autospec=True, side_effect=acquire) as limited:
+            call_command('warm_auth0_profiles', chunk_size=1, rate=10, workers=2, stdout=out)
+        self.assertIn('Warmed 3 profiles.', out.getvalue())
+        # one Auth0 search per chunk, the two after the first each wait a tenth of a second
+        self.assertEqual(limited.call_count, 3)
+        self.assertAlmostEqual(clock[0], 0.2)
+        for user in users[:3]:
+            self.assertIsNotNone(cache.get(Profile._get_cache_key(user.auth0_id)))
+        self.assertIsNone(cache.get(Profile._get_cache_key(users[3].auth0_id)))
+
+
+@override_settings(AUTH0_CLIENT='auth0user.clients.InMemoryClient')
+class TestCreateSiteUsers(TestCase):
+
+    def setUp(self):
+        get_client().clear()
+        cache.clear()
+        self.User = get_user_model()
+
+    def test_create_from_csv(self):
+        self.User.objects.create_user('jane@example.com', 'secret')
+        stdin = StringIO(
+            'email,first_name,last_name,email_verified\n'
+            'Jane@example.com,Jane,Doe,1\n'
+            'jill@example.com,Jill\n'
+            ',No,Email,\n')
+        out, err = StringIO(), StringIO()
+        call_command(
+            'createsiteusers', '--csv=-', stdin=stdin, stdout=out, stderr=err, chunk_size=2)
+        self.assertIn('Created 1, already existing 1, failed 1', out.getvalue())
+        self.assertIn('The email must be set', err.getvalue())
+        jill = self.User.objects.get(email='jill@example.com')
+        self.assertEqual(jill.given_name, 'Jill')
+
+
+@override_settings(AUTH0_CLIENT='auth0user.clients.InMemoryClient')
+class TestMigrateToAuth0user(TestCase):
+
+    multi_db = True
+
+    def setUp(self):
+        get_client().clear()
+        cache.clear()
+        self.User = get_user_model()
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        Site.objects.create(id=2, domain='example.org', name='example.org')
+        self.group = Group.objects.create(name='editors')
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TABLE legacy (id integer PRIMARY KEY, email varchar(254), '
+                'password varchar(128), first_name varchar(30), last_name varchar(30), '
+                'is_active bool, is_staff bool, is_superuser bool, date_joined datetime, '
+                'last_login datetime NULL)')
+            cursor.execute(
+                'CREATE TABLE legacy_groups (id integer PRIMARY KEY, user_id integer, '
+                'group_id integer)')
+            cursor.execute(
+                'CREATE TABLE legacy_user_permissions (id integer PRIMARY KEY, '
+                'user_id integer, permission_id integer)')
+            for i, email in enumerate(
+                    ['jane@example.com', 'john@example.com', 'jill@example.com', ''], 1):
+                cursor.execute(
+                    'INSERT INTO legacy VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, NULL)',
+                    [i, email, 'pbkdf2_sha256$x', 'First%s' % i, 'Last', True, i == 1, False,
+                     timezone.now().replace(tzinfo=None)])
+            cursor.execute('INSERT INTO legacy_groups VALUES (1, 1, %s)', [self.group.pk])
+
+    def migrate(self, **options):
+        out, err = StringIO(), StringIO()
+        call_command(
+            'migrate_to_auth0user', table='legacy', site_ids=[1, 2], chunk_size=2,
+            checkpoint=os.path.join(self.tmp, 'checkpoint'), stdout=out, stderr=err,
+            **options)
+        return out.getvalue(), err.getvalue()
+
+    def test_migrate(self):
+        john = get_client().users.create(email='john@example.com', password='secret')
+        export = os.path.join(self.tmp, 'export.json')
+        with open(export, 'w') as f:
+            f.write(json.dumps({'email': 'jill@example.com', 'user_id': 'auth0|jill'}) + '\n')
+
+        out, err = self.migrate(export=export)
+        self.assertIn('Created 6', out)
+        self.assertIn('failed 1', out)
+        self.assertEqual(self.User.objects.filter(auth0_id=john.user_id).count(), 2)
+        self.assertEqual(self.User.objects.filter(auth0_id='auth0|jill').count(), 2)
+        jane = self.User.objects.get(email='jane@example.com', site_id=2)
+        self.assertTrue(jane.is_staff)
+        self.assertEqual(jane.given_name, 'First1')
+        self.assertEqual(list(jane.groups.all()), [self.group])
+        self.assertEqual(jane.password, 'pbkdf2_sha256$x')
+
+        # resumed from the checkpoint, nothing is read again
+        out, err = self.migrate()
+        self.assertIn('Created 0, already existing 0, failed 0', out)
+        os.remove(os.path.join(self.tmp, 'checkpoint'))
+        out, err = self.migrate()
+        self.assertIn('Created 0, already existing 6', out)
+
+    def test_migrate_clears_cached_token_users(self):
+        john = get_client().users.create(email='john@example.com', password='secret')
+        self.assertIsNone(get_token_user(john.user_id, site_id=2))
+        self.migrate()
+        self.assertEqual(get_token_user(john.user_id, site_id=2).email, 'john@example.com')
+
+    @override_settings(
+        DATABASE_ROUTERS=['auth0user.routers.SiteShardRouter'], AUTH0_SITE_SHARDS={2: 'shard1'})
+    def test_migrate_to_another_shard(self):
+        # the legacy table's group has another id on the shard of site 2
+        Group.objects.using('shard1').create(name='shard only')
+        shard_group = Group.objects.using('shard1').create(name='editors')
+        self.assertNotEqual(shard_group.pk, self.group.pk)
+        self.migrate()
+        jane = self.User.objects.db_for_site(2).get(email='jane@example.com', site_id=2)
+        self.assertEqual(list(jane.groups.all()), [shard_group])
+        jane = self.User.objects.get(email='jane@example.com', site_id=1)
+        self.assertEqual(list(jane.groups.all()), [self.group])
+
+    def test_interrupted_chunk_is_rolled_back(self):
+        through = self.User.groups.through
+        bulk_create = models.Manager.bulk_create
+
+        def crash(manager, objs, *args, **kwargs):
+            if manager.model is through:
+                raise KeyboardInterrupt
+            return bulk_create(manager, objs, *args, **kwargs)
+
+        with mock.patch.object(models.Manager, 'bulk_create', autospec=True, side_effect=crash):
+            with self.assertRaises(KeyboardInterrupt):
+                self.migrate()
+        self.assertFalse(self.User.objects.exists())
+        self.migrate()
+        jane = self.User.objects.get(email='jane@example.com', site_id=1)
+        self.assertEqual(list(jane.groups.all()), [self.group])
+
+
+@override_settings(AUTH0_CLIENT='auth0user.clients.InMemoryClient')
+class TestCloneSiteUsers(TestCase):
+
+    def setUp(self):
+        get_client().clear()
+        cache.clear()
+        self.User = get_user_model()
+        Site.objects.create(id=2, domain='example.org', name='example.org')
+
+    def test_clone(self):
+        group = Group.objects.create(name='editors')
+        permission = Permission.objects.get(codename='change_group')
+        jane = self.User.objects.create_user('jane@example.com', 'secret', first_name='Jane')
+        self.User.objects.filter(pk=jane.pk).update(
+            date_joined=timezone.now() - timedelta(days=30), last_login=timezone.now())
+        jane.refresh_from_db()
+        jane.groups.add(group)
+        jane.user_permissions.add(permission)
+        self.User.objects.create_user('john@example.com', 'secret')
+        self.User.objects.create_user('john@example.com', 'secret', site_id=2)
+        out = StringIO()
+        with mock.patch.object(InMemoryUser, 'get') as get:
+            call_command(
+                'clone_site_users', '--from-site=1', '--to-site=2', chunk_size=1, stdout=out)
+        self.assertFalse(get.called)
+        self.assertIn('Copied 1 users, skipped 1', out.getvalue())
+        clone = self.User.objects.get(auth0_id=jane.auth0_id, site_id=2)
+        self.assertEqual(clone.given_name, 'Jane')
+        self.assertGreater(clone.date_joined, jane.date_joined)
+        self.assertIsNone(clone.last_login)
+        self.assertEqual(clone.password, jane.password)
+        self.assertEqual(list(clone.groups.all()), [group])
+        self.assertEqual(list(clone.user_permissions.all()), [permission])
+
+    def test_clone_clears_cached_token_users(self):
+        jane = self.User.objects.create_user('jane@example.com', 'secret')
+        self.assertIsNone(get_token_user(jane.auth0_id, site_id=2))
+        self.User.objects.clone_site(1, 2)
+        self.assertEqual(get_token_user(jane.auth0_id, site_id=2).site_id, 2)
+
+    def test_interrupted_chunk_is_rolled_back(self):
+        jane = self.User.objects.create_user('jane@example.com', 'secret')
+        group = Group.objects.create(name='editors')
+        jane.groups.add(group)
+        through = self.User.groups.through
+        bulk_create = models.Manager.bulk_create
+
+        def crash(manager, objs, *args, **kwargs):
+            if manager.model is through:
+                raise KeyboardInterrupt
+            return bulk_create(manager, objs, *args, **kwargs)
+
+        with mock.patch.object(models.Manager, 'bulk_create', autospec=True, side_effect=crash):
+            with self.assertRaises(KeyboardInterrupt):
+                self.User.objects.clone_site(1, 2)
+        self.assertFalse(self.User.objects.filter(site_id=2).exists())
+        self.assertEqual(self.User.objects.clone_site(1, 2), (1, 0))
+        clone = self.User.objects.get(auth0_id=jane.auth0_id, site_id=2)
+        self.assertEqual(list(clone.groups.all()), [group])
+
+
+@override_settings(
+    AUTH0_CLIENT='auth0user.clients.InMemoryClient',
+    DATABASE_ROUTERS=['auth0user.routers.SiteShardRouter'],
+    AUTH0_SITE_SHARDS={2: 'shard1'})
+class TestShardedCloneSiteUsers(TestCase):
+
+    multi_db = True
+
+    def setUp(self):
+        get_client().clear()
+        cache.clear()
+        self.User = get_user_model()
+        Site.objects.create(id=2, domain='example.org', name='example.org')
+
+    def test_clone_to_another_shard(self):
+        jane = self.User.objects.create_user('jane@example.com', 'secret')
+        group = Group.objects.using('default').create(name='editors')
+        Group.objects.using('default').create(name='default only')
+        permission = Permission.objects.using('default').get(codename='change_group')
+        jane.groups.add(group, Group.objects.using('default').get(name='default only'))
+        jane.user_permissions.add(permission)
+        # the other shard has the same group and permission under other ids
+        Group.objects.using('shard1').create(name='shard only')
+        shard_group = Group.objects.using('shard1').create(name='editors')
+        shard_permission = Permission.objects.using('shard1').get(codename='change_group')
+        shard_permission.delete()
+        shard_permission.pk = None
+        shard_permission.save(using='shard1')
+        self.assertNotEqual(shard_group.pk, group.pk)
+        self.assertNotEqual(shard_permission.pk, permission.pk)
+
+        self.assertEqual(self.User.objects.clone_site(1, 2), (1, 0))
+        clone = self.User.objects.db_for_site(2).get(auth0_id=jane.auth0_id, site_id=2)
+        self.assertEqual(list(clone.groups.all()), [shard_group])
+        self.assertEqual(list(clone.user_permissions.all()), [shard_permission])
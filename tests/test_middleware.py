@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_django-auth0user
+------------
+
+Tests for `django-auth0user` middleware module.
+"""
+
+import json
+import time
+from unittest import skipIf
+
+import mock
+import requests
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sites.models import Site
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from auth0user import backends
+from auth0user.claims import CLAIMS_SESSION_KEY, get_claims
+from auth0user.clients import get_client
+from auth0user.middleware import auth0_token_middleware, auth0user_middleware
+from auth0user.models import Profile
+from auth0user.views import authenticate
+
+
+@override_settings(AUTH0_CLIENT='auth0user.clients.InMemoryClient')
+class TestClaims(TestCase):
+
+    def setUp(self):
+        get_client().clear()
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'jane@example.com', 'secret', first_name='Jane', last_name='Doe')
+
+    def get_request(self):
+        request = RequestFactory().get('/')
+        request.session = self.client.session
+        request.user = get_user_model().objects.get(pk=self.user.pk)
+        return request
+
+    def test_claims_stored_at_login(self):
+        self.client.force_login(self.user)
+        self.assertIn(CLAIMS_SESSION_KEY, self.client.session)
+        request = self.get_request()
+        with mock.patch.object(Profile, 'get') as get:
+            claims = get_claims(request)
+        self.assertFalse(get.called)
+        self.assertEqual(claims['name'], 'Jane Doe')
+        self.assertEqual(claims['sub'], self.user.auth0_id)
+
+    def test_claims_refreshed_on_save(self):
+        self.client.force_login(self.user)
+        request = self.get_request()
+
+        def view(request):
+            user = get_user_model().objects.get(pk=self.user.pk)
+            user.first_name = 'Janet'
+            user.save()
+            return HttpResponse()
+
+        auth0user_middleware(view)(request)
+        self.assertEqual(request.auth0_claims['given_name'], 'Janet')
+        self.assertEqual(get_claims(request)['name'], 'Janet Doe')
+
+    def test_anonymous(self):
+        request = RequestFactory().get('/')
+        request.session = self.client.session
+        self.assertEqual(get_claims(request), {})
+
+
+@override_settings(
+    AUTH0_CLIENT='auth0user.clients.InMemoryClient', ALLOWED_HOSTS=['*'])
+class TestRequestSite(TestCase):
+
+    def setUp(self):
+        get_client().clear()
+        cache.clear()
+        self.site = Site.objects.create(domain='example.org', name='example.org')
+        self.User = get_user_model()
+
+    def call(self, host, view):
+        request = RequestFactory().get('/', HTTP_HOST=host)
+        request.user = AnonymousUser()
+        return auth0user_middleware(view)(request)
+
+    def test_users_follow_request_host(self):
+        jane = self.User.objects.create_user('jane@example.com', 'secret')
+        other = self.User.objects.create_user(
+            'jane@example.com', 'secret', site_id=self.site.id)
+        found = {}
+
+        def view(request):
+            found['user'] = authenticate(jane.auth0_id)
+            found['created'] = self.User.objects.create_user('john@example.com', 'secret')
+            found['on_site'] = list(self.User.on_site.all())
+            return HttpResponse()
+
+        self.call('example.org:8000', view)
+        self.assertEqual(found['user'], other)
+        self.assertEqual(found['created'].site_id, self.site.id)
+        self.assertEqual(set(found['on_site']), set([other, found['created']]))
+        # outside the request the default site is used again
+        self.assertEqual(self.User.objects.get_by_natural_key(jane.auth0_id), jane)
+
+    def test_profiles_shared_within_request(self):
+        jane = self.User.objects.create_user('jane@example.com', 'secret')
+        profiles = []
+
+        def view(request):
+            for user in (self.User.objects.get(pk=jane.pk), self.User.objects.get(pk=jane.pk)):
+                profiles.append(user.profile)
+            return HttpResponse()
+
+        self.call('testserver', view)
+        self.call('testserver', view)
+        self.assertIs(profiles[0], profiles[1])
+        self.assertIsNot(profiles[1], profiles[3])
+
+    def test_site_added_by_another_process(self):
+        self.call('example.com', lambda request: HttpResponse())
+        # saved without the signal that clears this process's host map
+        Site.objects.bulk_create([Site(id=5, domain='example.net', name='example.net')])
+        seen = []
+        self.call('example.net', lambda request: seen.append(
+            self.User.objects.create_user('jill@example.com', 'secret').site_id) or HttpResponse())
+        self.assertEqual(seen, [5])
+
+    def test_host_cache_cleared_on_site_change(self):
+        self.call('example.net', lambda request: HttpResponse())
+        self.site.domain = 'example.net'
+        self.site.save()
+        seen = []
+        self.call('example.net', lambda request: seen.append(
+            self.User.objects.create_user('jill@example.com', 'secret').site_id) or HttpResponse())
+        self.assertEqual(seen, [self.site.id])
+
+
+@skipIf(backends.jwt is None, 'PyJWT is not installed')
+@override_settings(
+    AUTH0_CLIENT='auth0user.clients.InMemoryClient', AUTH0_DOMAIN='example.auth0.com',
+    AUTH0_API_AUDIENCE='https://api.example.com/')
+class TestBearerToken(TestCase):
+
+    def setUp(self):
+        from cryptography.hazmat.backends import default_backend
+        from cryptography.hazmat.primitives.asymmetric import rsa
+        get_client().clear()
+        cache.clear()
+        backends._jwks.clear()
+        self.key = rsa.generate_private_key(65537, 2048, default_backend())
+        jwk = json.loads(backends.RSAAlgorithm.to_jwk(self.key.public_key()))
+        jwk.update(kid='key1')
+        patcher = mock.patch.object(backends, 'fetch_jwks', return_value={'keys': [jwk]})
+        self.fetch_jwks = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = get_user_model().objects.create_user('jane@example.com', 'secret')
+
+    def get_token(self, **claims):
+        payload = {
+            'sub': self.user.auth0_id, 'aud': 'https://api.example.com/',
+            'iss': 'https://example.auth0.com/', 'exp': int(time.time()) + 60}
+        payload.update(claims)
+        token = backends.jwt.encode(payload, self.key, 'RS256', headers={'kid': 'key1'})
+        return token.decode() if isinstance(token, bytes) else token
+
+    def call(self, token):
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION='Bearer %s' % token)
+        request.user = AnonymousUser()
+        seen = []
+        auth0_token_middleware(lambda request: seen.append(request.user) or HttpResponse())(
+            request)
+        return seen[0]
+
+    def test_authenticated_from_token(self):
+        self.assertEqual(self.call(self.get_token()), self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.call(self.get_token()), self.user)
+        self.assertEqual(self.fetch_jwks.call_count, 1)
+
+    def test_invalid_tokens(self):
+        self.assertTrue(self.call(self.get_token(aud='other')).is_anonymous())
+        self.assertTrue(self.call(self.get_token(exp=int(time.time()) - 60)).is_anonymous())
+        self.assertTrue(self.call(self.get_token(sub='auth0|missing')).is_anonymous())
+        self.assertTrue(self.call('garbage').is_anonymous())
+
+    def test_signing_keys_unavailable(self):
+        self.assertEqual(self.call(self.get_token()), self.user)
+        self.fetch_jwks.side_effect = requests.ConnectionError('Connection refused')
+        cache.clear()
+        url = backends.get_jwks_url()
+        backends._jwks[url] = (backends._jwks[url][0], 0, 0)  # expired
+        self.assertEqual(self.call(self.get_token()), self.user)
+        backends._jwks.clear()
+        self.assertTrue(self.call(self.get_token()).is_anonymous())
+
+    def test_malformed_signing_key_skipped(self):
+        jwk = self.fetch_jwks.return_value['keys'][0]
+        self.fetch_jwks.return_value = {'keys': [
+            {'kty': 'RSA', 'kid': 'key0'}, dict(jwk, kid='bad', n='!!'), jwk]}
+        self.assertEqual(self.call(self.get_token()), self.user)
+        self.assertEqual(list(backends.get_signing_keys()), ['key1'])
+
+    def test_without_pyjwt(self):
+        token = self.get_token()
+        with mock.patch.object(backends, 'jwt', None):
+            self.assertIsNone(backends.Auth0TokenBackend().authenticate(token=token))
+
+    def test_deactivated_user(self):
+        self.assertEqual(self.call(self.get_token()), self.user)
+        get_user_model().objects.set_active_many([self.user.auth0_id], False, block=False)
+        self.assertTrue(self.call(self.get_token()).is_anonymous())
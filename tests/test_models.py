@@ -8,18 +8,393 @@ test_django-auth0user
 Tests for `django-auth0user` models module.
 """
 
-from django.test import TestCase
+import json
+import threading
 
-from auth0user import models
+import mock
+import requests
 
+from auth0plus.exceptions import Auth0Error
 
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.contrib.sites.models import Site
+from django.core.cache import cache
+from django.db import connection
+from django.db.migrations.state import ProjectState
+from django.test import TestCase, override_settings
+
+from auth0user.backends import get_token_user
+from auth0user.clients import get_client, InMemoryUser
+from auth0user.models import (
+    Profile, ProfileSnapshot, _generations, identity_map, profile_stats)
+from auth0user.operations import LowercaseEmails
+from auth0user.utils import HEDGE_WORKERS_DEFAULT, submit_if_idle
+
+
+@override_settings(AUTH0_CLIENT='auth0user.clients.InMemoryClient')
 class TestAuth0user(TestCase):
 
     def setUp(self):
-        pass
+        get_client().clear()
+        cache.clear()
+        self.User = get_user_model()
+
+    def test_create_user(self):
+        user = self.User.objects.create_user(
+            'jane@example.com', 'secret', first_name='Jane', last_name='Doe')
+        self.assertTrue(user.auth0_id.startswith('auth0|'))
+        self.assertEqual(user.get_full_name(), 'Jane Doe')
+        self.assertEqual(
+            self.User.objects.get_by_natural_key(user.auth0_id), user)
+
+    def test_create_user_on_second_site_reuses_auth0_user(self):
+        user = self.User.objects.create_user('jane@example.com', 'secret')
+        site = Site.objects.create(domain='example.org', name='example.org')
+        with mock.patch.object(InMemoryUser, 'get_or_create') as get_or_create:
+            other = self.User.objects.create_user(
+                'Jane@example.com', 'secret', site_id=site.id)
+        self.assertFalse(get_or_create.called)
+        self.assertEqual(other.auth0_id, user.auth0_id)
+        self.assertEqual(
+            self.User.objects.get_identities(['JANE@example.com'])['jane@example.com'][0],
+            user.auth0_id)
+        self.assertEqual(other.email, 'jane@example.com')
+        # stored with another case before emails were lowercased
+        self.User.objects.filter(site_id=site.id).update(email='JaNe@example.com')
+        LowercaseEmails('user').database_forwards(
+            'siteuser', mock.Mock(connection=connection), None, ProjectState.from_apps(apps))
+        self.assertEqual(
+            set(self.User.objects.values_list('email', flat=True)), set(['jane@example.com']))
+
+    def test_profile_save(self):
+        user = self.User.objects.create_user('jane@example.com', 'secret')
+        user.first_name = 'Jane'
+        user.save()
+        cache.clear()
+        self.assertEqual(Profile.get(user.auth0_id).given_name, 'Jane')
+
+    @override_settings(AUTH0_RETRIES=2)
+    def test_retried_fetch(self):
+        user = self.User.objects.create_user('jane@example.com', 'secret', first_name='Jane')
+        cache.clear()
+        busy = Auth0Error(status_code=429, error_code='too_many_requests', message='Slow down')
+        get = InMemoryUser.get
+        with mock.patch.object(InMemoryUser, 'get', side_effect=[busy, get(user.auth0_id)]):
+            self.assertEqual(Profile.get(user.auth0_id).given_name, 'Jane')
+        self.assertGreaterEqual(Profile.get_latency_stats()['retries'], 1)
+        # transient network failures and error pages that aren't JSON
+        cache.clear()
+        failures = [requests.ConnectionError('Connection reset'), ValueError('Not JSON')]
+        with mock.patch.object(
+                InMemoryUser, 'get', side_effect=failures + [get(user.auth0_id)]) as retried:
+            self.assertEqual(Profile.get(user.auth0_id).given_name, 'Jane')
+        self.assertEqual(retried.call_count, 3)
+
+    @override_settings(AUTH0_HEDGE=True)
+    def test_hedged_fetch(self):
+        user = self.User.objects.create_user('jane@example.com', 'secret', first_name='Jane')
+        cache.clear()
+        release = threading.Event()
+        auth0user = InMemoryUser.get(user.auth0_id)
+        calls = []
+
+        def get(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == 1:
+                release.wait(5)  # the first request hangs until the test ends
+            return auth0user
+
+        hedges = profile_stats.counts['hedge_wins']
+        with mock.patch.object(InMemoryUser, 'get', side_effect=get):
+            with mock.patch('auth0user.utils.CallPolicy.get_hedge_delay', return_value=0.01):
+                self.assertEqual(Profile.get(user.auth0_id).given_name, 'Jane')
+        release.set()
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(profile_stats.counts['hedge_wins'], hedges + 1)
+
+    @override_settings(AUTH0_HEDGE=True)
+    def test_hedged_fetch_with_busy_pool(self):
+        user = self.User.objects.create_user('jane@example.com', 'secret', first_name='Jane')
+        cache.clear()
+        release = threading.Event()
+        self.addCleanup(release.set)
+        # every hedge worker is stuck on an earlier request
+        hung = [
+            submit_if_idle('AUTH0_HEDGE_WORKERS', HEDGE_WORKERS_DEFAULT, release.wait, 5)
+            for i in range(HEDGE_WORKERS_DEFAULT)]
+        self.assertNotIn(None, hung)
+        auth0user = InMemoryUser.get(user.auth0_id)
+        threads = []
+
+        def get(*args, **kwargs):
+            threads.append(threading.current_thread())
+            return auth0user
+
+        skipped = profile_stats.counts['hedges_skipped']
+        count = threading.active_count()
+        with mock.patch.object(InMemoryUser, 'get', side_effect=get):
+            self.assertEqual(Profile.get(user.auth0_id).given_name, 'Jane')
+        # read inline without a hedge rather than on another thread
+        self.assertEqual(threads, [threading.current_thread()])
+        self.assertEqual(threading.active_count(), count)
+        self.assertEqual(profile_stats.counts['hedges_skipped'], skipped + 1)
+
+    @override_settings(AUTH0_PROFILE_CACHE=60, AUTH0_PROFILE_CACHE_MAX=200)
+    def test_adaptive_cache_timeout(self):
+        user = self.User.objects.create_user('jane@example.com', 'secret', first_name='Jane')
+        key = Profile._get_cache_key(user.auth0_id)
+
+        def refetch():
+            cache.delete(key)  # expired
+            Profile.get(user.auth0_id)
+            return cache.get('%s.meta' % key)[1]
+
+        self.assertEqual([refetch(), refetch(), refetch()], [120, 200, 200])
+        auth0user = InMemoryUser.get(user.auth0_id)
+        auth0user.user_metadata = {'given_name': 'Janet'}
+        auth0user.save()
+        self.assertEqual(refetch(), 60)
+        self.assertEqual(refetch(), 120)
+        user.profile.given_name = 'Jan'
+        user.profile.save()
+        self.assertEqual(cache.get('%s.meta' % key)[1], 60)
+
+    @override_settings(AUTH0_PROFILE_CACHE=60, AUTH0_PROFILE_CACHE_MAX=480)
+    def test_save_drops_projections(self):
+        user = self.User.objects.create_user('jane@example.com', 'secret', first_name='Jane')
+        fields = ('user_metadata',)
+        key = Profile._get_cache_key(user.auth0_id, Profile._get_fields(fields))
+        for i in range(4):
+            cache.delete_many([key, Profile._get_cache_key(user.auth0_id)])
+            Profile.get(user.auth0_id, fields=fields)
+        self.assertEqual(cache.get('%s.meta' % key)[1], 480)
+        profile = Profile.get(user.auth0_id)
+        profile.given_name = 'Janet'
+        profile.save()
+        self.assertIsNone(cache.get(key))
+        self.assertIsNone(cache.get('%s.meta' % key))
+        cache.delete(Profile._get_cache_key(user.auth0_id))  # expired
+        self.assertEqual(Profile.get(user.auth0_id, fields=fields).given_name, 'Janet')
+
+    def test_invalidate_many_drops_projections(self):
+        user = self.User.objects.create_user('jane@example.com', 'secret')
+        fields = Profile._get_fields(('email_verified', 'picture'))
+        cache.clear()
+        Profile.get(user.auth0_id, fields=fields)
+        key = Profile._get_cache_key(user.auth0_id, fields)
+        self.assertIsNotNone(cache.get(key))
+        Profile.invalidate_many([user.auth0_id])
+        self.assertIsNone(cache.get(key))
+
+    def test_add_projection_waits_for_the_lock(self):
+        key = 'auth0user.projections.%s' % Profile._get_cache_namespace()
+        cache.add('%s.lock' % key, True)
+
+        def other_process(seconds):
+            # another process holding the lock records its projection and releases it
+            cache.set(key, set([('email', 'user_id')]), None)
+            cache.delete('%s.lock' % key)
+
+        with mock.patch('auth0user.models.time.sleep', side_effect=other_process) as sleep:
+            Profile._add_projection(('picture', 'user_id'))
+        self.assertEqual(sleep.call_count, 1)
+        self.assertEqual(cache.get(key), set([('email', 'user_id'), ('picture', 'user_id')]))
+        self.assertIsNone(cache.get('%s.lock' % key))
+
+    def test_cache_generation_is_only_initialized_on_a_miss(self):
+        _generations.clear()
+        Profile.get_cache_generation()
+        _generations.clear()
+        with mock.patch('auth0user.models.cache.add') as add:
+            Profile.get_cache_generation()
+        self.assertFalse(add.called)
+
+    def test_bump_cache_generation(self):
+        user = self.User.objects.create_user('jane@example.com', 'secret', first_name='Jane')
+        Profile.get(user.auth0_id)
+        key = Profile._get_cache_key(user.auth0_id)
+        self.assertIsNotNone(cache.get(key))
+        generation = Profile.get_cache_generation()
+        self.assertGreater(Profile.bump_cache_generation(), generation)
+        self.assertNotEqual(Profile._get_cache_key(user.auth0_id), key)
+        with mock.patch.object(InMemoryUser, 'get', wraps=InMemoryUser.get) as get:
+            self.assertEqual(Profile.get(user.auth0_id).given_name, 'Jane')
+        self.assertTrue(get.called)
+        with override_settings(AUTH0_DOMAIN='other.auth0.com'):
+            self.assertIn('.other.auth0.com.', Profile._get_cache_key(user.auth0_id))
+
+    def test_missing_profile(self):
+        profile = Profile.get('auth0|missing')
+        self.assertEqual(profile.email, '')
+
+    def test_get_many(self):
+        jane = self.User.objects.create_user('jane@example.com', 'secret', first_name='Jane')
+        john = self.User.objects.create_user('john@example.com', 'secret', first_name='John')
+        cache.clear()
+        profiles = Profile.get_many([jane.auth0_id, john.auth0_id, 'auth0|missing'])
+        self.assertEqual(profiles[jane.auth0_id].given_name, 'Jane')
+        self.assertEqual(profiles[john.auth0_id].given_name, 'John')
+        self.assertEqual(profiles['auth0|missing'].email, '')
+        self.assertIsNotNone(cache.get(Profile._get_cache_key(jane.auth0_id)))
+
+    def test_identity_map(self):
+        Site.objects.create(id=2, domain='example.org', name='example.org')
+        jane = self.User.objects.create_user('jane@example.com', 'secret', first_name='Jane')
+        other = self.User.objects.create_user('jane@example.com', 'secret', site_id=2)
+        self.assertIsNot(jane.profile, other.profile)
+        with identity_map():
+            jane, other = self.User.objects.filter(auth0_id=jane.auth0_id)
+            projection = Profile.get(jane.auth0_id, fields=('user_metadata',))
+            projection.given_name = 'Janet'
+            # the complete profile is merged in, keeping the unsaved change
+            self.assertIs(jane.profile, projection)
+            self.assertIsNone(projection._fields)
+            self.assertEqual(projection.email, 'jane@example.com')
+            self.assertEqual(projection.given_name, 'Janet')
+            with mock.patch.object(cache, 'get_many', wraps=cache.get_many) as get_many:
+                self.assertIs(other.profile, projection)
+                self.assertIs(Profile.get(jane.auth0_id, fields=('email',)), projection)
+                self.assertIs(Profile.get_many([jane.auth0_id])[jane.auth0_id], projection)
+            self.assertFalse(get_many.called)
+        self.assertIsNot(Profile.get(jane.auth0_id), projection)
+
+    @override_settings(AUTH0_LOCAL_PASSWORD=False)
+    def test_no_local_password(self):
+        user = self.User.objects.create_user('jane@example.com', 'secret')
+        self.assertFalse(user.has_usable_password())
+        self.assertEqual(user.profile.password, 'secret')
+
+    def test_bulk_create_users(self):
+        jane = self.User.objects.create_user('jane@example.com', 'secret')
+        get_client().users.create(email='john@example.com', password='secret')
+        rows = [
+            {'email': 'jane@example.com'},
+            {'email': 'john@example.com'},
+            {'email': 'jill@example.com', 'first_name': 'Jill'},
+            {'email': ''},
+        ]
+        results = dict(
+            (r.email, r) for r in self.User.objects.bulk_create_users(rows, chunk_size=2))
+        self.assertEqual(results['jane@example.com'].status, 'exists')
+        self.assertEqual(results['jane@example.com'].auth0_id, jane.auth0_id)
+        self.assertEqual(results['john@example.com'].status, 'created')
+        self.assertEqual(results['jill@example.com'].status, 'created')
+        self.assertEqual(results[''].status, 'failed')
+        jill = self.User.objects.get(email='jill@example.com')
+        self.assertEqual(jill.auth0_id, results['jill@example.com'].auth0_id)
+        self.assertEqual(jill.first_name, 'Jill')
+        self.assertEqual(self.User.objects.count(), 3)
+
+    def test_bulk_create_users_mixed_case(self):
+        jane = self.User.objects.create_user('jane@example.com', 'secret')
+        john = get_client().users.create(email='john@example.com', password='secret')
+        rows = [{'email': 'Jane@Example.com'}, {'email': 'John@example.com'},
+                {'email': 'JOHN@example.com'}]
+        results = sorted(
+            (r.email, r.status, r.auth0_id) for r in self.User.objects.bulk_create_users(rows))
+        self.assertEqual(results, [
+            ('jane@example.com', 'exists', jane.auth0_id),
+            ('john@example.com', 'created', john.user_id),
+            ('john@example.com', 'failed', None)])
+        # another email of someone already on the site
+        self.User.objects.filter(auth0_id=john.user_id).update(email='j@example.com')
+        results = list(self.User.objects.bulk_create_users([{'email': 'john@example.com'}]))
+        self.assertEqual(results[0].status, 'exists')
+        self.assertEqual(self.User.objects.count(), 2)
+
+    def test_bulk_create_users_clears_cached_token_users(self):
+        john = get_client().users.create(email='john@example.com', password='secret')
+        self.assertIsNone(get_token_user(john.user_id))
+        list(self.User.objects.bulk_create_users([{'email': 'john@example.com'}]))
+        self.assertEqual(get_token_user(john.user_id).email, 'john@example.com')
+
+    def test_set_active_many(self):
+        jane = self.User.objects.create_user('jane@example.com', 'secret')
+        site = Site.objects.create(domain='example.org', name='example.org')
+        self.User.objects.create_user('jane@example.com', 'secret', site_id=site.id)
+        john = self.User.objects.create_user('john@example.com', 'secret')
+        results = self.User.objects.set_active_many(
+            [jane.auth0_id, john.auth0_id, 'auth0|missing'], False, chunk_size=2)
+        self.assertEqual([r.rows for r in results], [2, 1, 0])
+        self.assertEqual([bool(r.error) for r in results], [False, False, True])
+        self.assertFalse(self.User.objects.filter(is_active=True).exists())
+        self.assertTrue(Profile.get(jane.auth0_id).blocked)
+        self.User.objects.set_active_many([jane.auth0_id], True)
+        self.assertEqual(self.User.objects.filter(is_active=True).count(), 2)
+        self.assertFalse(Profile.get(jane.auth0_id).blocked)
+
+    @override_settings(AUTH0_PROFILE_SNAPSHOTS=True)
+    def test_snapshot_fallback(self):
+        user = self.User.objects.create_user(
+            'jane@example.com', 'secret', first_name='Jane', last_name='Doe')
+        cache.clear()
+        down = Auth0Error(status_code=503, error_code='unavailable', message='Down')
+        with mock.patch.object(InMemoryUser, 'get', side_effect=down):
+            self.assertEqual(Profile.get(user.auth0_id).given_name, 'Jane')
+        with mock.patch.object(InMemoryUser, 'query', side_effect=down):
+            profiles = Profile.get_many([user.auth0_id])
+        self.assertEqual(profiles[user.auth0_id].family_name, 'Doe')
+        # Auth0 can't be reached at all
+        unreachable = requests.ConnectionError('Connection refused')
+        with mock.patch.object(InMemoryUser, 'get', side_effect=unreachable):
+            self.assertEqual(Profile.get(user.auth0_id).given_name, 'Jane')
+        with mock.patch.object(InMemoryUser, 'query', side_effect=unreachable):
+            profiles = Profile.get_many([user.auth0_id])
+        self.assertEqual(profiles[user.auth0_id].family_name, 'Doe')
+        # a proxy answers with an HTML error page
+        not_json = ValueError('No JSON object could be decoded')
+        with mock.patch.object(InMemoryUser, 'get', side_effect=not_json):
+            self.assertEqual(Profile.get(user.auth0_id).given_name, 'Jane')
+
+    @override_settings(AUTH0_PROFILE_SNAPSHOTS=True)
+    def test_concurrent_snapshot(self):
+        user = self.User.objects.create_user('jane@example.com', 'secret', first_name='Jane')
+        ProfileSnapshot.objects.all().delete()
+        cache.clear()
+        bulk_create = ProfileSnapshot.objects.bulk_create
+
+        def racing(objs):
+            # another process stores the same snapshot first
+            ProfileSnapshot.objects.create(auth0_id=objs[0].auth0_id, data='{}')
+            return bulk_create(objs)
+
+        with mock.patch.object(ProfileSnapshot.objects, 'bulk_create', side_effect=racing):
+            self.assertEqual(Profile.get(user.auth0_id).given_name, 'Jane')
+        snapshot = ProfileSnapshot.objects.get(auth0_id=user.auth0_id)
+        self.assertEqual(json.loads(snapshot.data)['user_metadata']['given_name'], 'Jane')
 
-    def test_something(self):
-        pass
+    def test_profile_fields(self):
+        user = self.User.objects.create_user(
+            'jane@example.com', 'secret', first_name='Jane', last_name='Doe')
+        user.profile.app_metadata = {'plan': 'gold'}
+        user.profile.save()
+        cache.clear()
+        profile = Profile.get(user.auth0_id, fields=['user_metadata'])
+        self.assertEqual(profile.given_name, 'Jane')
+        self.assertFalse(hasattr(profile, 'app_metadata'))
+        self.assertIsNotNone(
+            cache.get(Profile._get_cache_key(user.auth0_id, ('user_id', 'user_metadata'))))
+        profile.given_name = 'Janet'
+        profile.save()
+        cache.clear()
+        profile = Profile.get(user.auth0_id)
+        self.assertEqual(profile.given_name, 'Janet')
+        self.assertEqual(profile.family_name, 'Doe')
+        self.assertEqual(profile.app_metadata, {'plan': 'gold'})
 
-    def tearDown(self):
-        pass
+    def test_name_columns(self):
+        user = self.User.objects.create_user(
+            'jane@example.com', 'secret', first_name='Jane', last_name='Doe')
+        site = Site.objects.create(domain='example.org', name='example.org')
+        other = self.User.objects.create_user('jane@example.com', 'secret', site_id=site.id)
+        self.assertEqual(other.given_name, 'Jane')
+        user.first_name = 'Janet'
+        user.save()
+        self.assertEqual(
+            list(self.User.objects.filter(given_name='Janet').order_by('site_id').values_list(
+                'site_id', flat=True)),
+            [1, site.id])
+        self.assertEqual(
+            list(self.User.objects.order_by('family_name').values_list('family_name', flat=True)),
+            ['Doe', 'Doe'])
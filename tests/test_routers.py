@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_django-auth0user
+------------
+
+Tests for `django-auth0user` routers module.
+"""
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser, Group
+from django.contrib.sites.models import Site
+from django.core.cache import cache
+from django.db import router
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from auth0user import routers
+from auth0user.clients import get_client
+from auth0user.middleware import auth0user_middleware
+from auth0user.sites import current_site
+
+
+@override_settings(
+    AUTH0_CLIENT='auth0user.clients.InMemoryClient',
+    DATABASE_ROUTERS=['auth0user.routers.SiteShardRouter'],
+    AUTH0_SITE_SHARDS={2: 'shard1'})
+class TestSiteShardRouter(TestCase):
+
+    multi_db = True
+
+    def setUp(self):
+        get_client().clear()
+        cache.clear()
+        Site.objects.create(id=2, domain='example.org', name='example.org')
+        self.User = get_user_model()
+
+    def test_users_stored_on_site_shard(self):
+        jane = self.User.objects.create_user('jane@example.com', 'secret')
+        other = self.User.objects.create_user('jane@example.com', 'secret', site_id=2)
+        self.assertEqual(jane._state.db, 'default')
+        self.assertEqual(other._state.db, 'shard1')
+        self.assertFalse(self.User.objects.using('default').filter(site_id=2).exists())
+        self.assertEqual(self.User.objects.get_by_natural_key(other.auth0_id, site_id=2), other)
+        with current_site(2):
+            self.assertEqual(list(self.User.on_site.all()), [other])
+            self.assertEqual(self.User.objects.get_by_natural_key(other.auth0_id), other)
+
+    def test_groups_follow_users(self):
+        user = self.User.objects.create_user('jane@example.com', 'secret', site_id=2)
+        with current_site(2):
+            group = Group.objects.create(name='editors')
+        self.assertEqual(group._state.db, 'shard1')
+        user.groups.add(group)
+        self.assertEqual(list(user.groups.all()), [group])
+
+    def test_fan_out(self):
+        jane = self.User.objects.create_user('jane@example.com', 'secret')
+        self.User.objects.create_user('jane@example.com', 'secret', site_id=2)
+        self.assertEqual(len(self.User.objects.shards()), 2)
+        jane.change_email('jane.doe@example.com')
+        for users in self.User.objects.shards():
+            self.assertEqual(
+                list(users.values_list('email', flat=True)), ['jane.doe@example.com'])
+        self.assertIn('jane.doe@example.com', self.User.objects.get_identities(
+            ['Jane.Doe@example.com']))
+
+
+@override_settings(
+    AUTH0_CLIENT='auth0user.clients.InMemoryClient',
+    DATABASE_ROUTERS=['auth0user.routers.ReplicaRouter'],
+    AUTH0_REPLICA_DATABASES={'default': ['replica']})
+class TestReplicaRouter(TestCase):
+
+    def setUp(self):
+        get_client().clear()
+        cache.clear()
+        routers.unpin()
+        self.User = get_user_model()
+
+    def call(self, view, cookies=None):
+        request = RequestFactory().get('/')
+        request.COOKIES.update(cookies or {})
+        request.user = AnonymousUser()
+        return auth0user_middleware(view)(request)
+
+    def test_reads_from_replica_until_written(self):
+        self.assertEqual(router.db_for_read(self.User), 'replica')
+        self.assertEqual(router.db_for_read(Site), 'default')
+        self.assertEqual(router.db_for_write(self.User), 'default')
+        self.assertEqual(router.db_for_read(self.User), 'default')
+        routers.unpin()
+        self.assertEqual(router.db_for_read(Group), 'replica')
+
+    def test_pinned_after_write(self):
+        routers.pin()
+        jane = self.User.objects.create_user('jane@example.com', 'secret')
+        routers.unpin()
+        reads = []
+
+        def read(request):
+            reads.append(router.db_for_read(self.User))
+            return HttpResponse()
+
+        def write(request):
+            self.User.objects.filter(pk=jane.pk).update(is_staff=True)
+            return HttpResponse()
+
+        self.call(read)
+        response = self.call(write)
+        self.assertIn(routers.REPLICA_PIN_COOKIE, response.cookies)
+        self.call(read, {routers.REPLICA_PIN_COOKIE: '1'})
+        self.assertEqual(reads, ['replica', 'default'])
+        self.assertFalse(routers.is_pinned())
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_django-auth0user
+------------
+
+Tests for `django-auth0user` views module.
+"""
+
+import json
+
+import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.sites.models import Site
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from auth0user.clients import InMemoryUser, get_client
+from auth0user.models import Profile, ProfileSnapshot
+
+
+@override_settings(
+    AUTH0_CLIENT='auth0user.clients.InMemoryClient', AUTH0_EVENTS_TOKEN='events-secret')
+class TestEvents(TestCase):
+
+    def setUp(self):
+        get_client().clear()
+        cache.clear()
+        self.user = get_user_model().objects.create_user('jane@example.com', 'secret')
+        self.key = Profile._get_cache_key(self.user.auth0_id)
+
+    def post(self, events, token='events-secret'):
+        return self.client.post(
+            reverse('auth0user:events'), json.dumps(events), content_type='application/json',
+            HTTP_AUTHORIZATION='Bearer %s' % token)
+
+    @override_settings(AUTH0_EVENTS_REFRESH=False)
+    def test_invalidates_profiles(self):
+        Profile.get(self.user.auth0_id)
+        self.assertIsNotNone(cache.get(self.key))
+        response = self.post([
+            {'log_id': '1', 'data': {'type': 'sapi', 'details': {'request': {
+                'path': '/api/v2/users/%s' % self.user.auth0_id.replace('|', '%7C')}}}},
+            {'log_id': '2', 'data': {'type': 's', 'user_id': 'auth0|other'}},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'invalidated': 2})
+        self.assertIsNone(cache.get(self.key))
+
+    @override_settings(AUTH0_PROFILE_SNAPSHOTS=True)
+    def test_refreshes_profiles(self):
+        Profile.get(self.user.auth0_id)
+        # the name is changed in the Auth0 dashboard
+        InMemoryUser._store[self.user.auth0_id]['user_metadata'] = {'given_name': 'Janet'}
+        response = self.post({'logs': [{'data': {'user_id': self.user.auth0_id}}]})
+        self.assertEqual(response.json(), {'invalidated': 1})
+        self.assertEqual(cache.get(self.key).user_metadata, {'given_name': 'Janet'})
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.given_name, 'Janet')
+        snapshot = ProfileSnapshot.objects.get(auth0_id=self.user.auth0_id)
+        self.assertEqual(json.loads(snapshot.data)['user_metadata'], {'given_name': 'Janet'})
+
+    def test_rejects_malformed_batches(self):
+        for events in (5, 'x', None, {'logs': 5}, [{'user_id': {'nested': 1}}]):
+            self.assertEqual(self.post(events).status_code, 400)
+
+    def test_requires_token(self):
+        Profile.get(self.user.auth0_id)
+        response = self.post([{'user_id': self.user.auth0_id}], token='wrong')
+        self.assertEqual(response.status_code, 403)
+        self.assertIsNotNone(cache.get(self.key))
+
+
+@override_settings(AUTH0_CLIENT='auth0user.clients.InMemoryClient')
+class TestSiteUserAdmin(TestCase):
+
+    def setUp(self):
+        get_client().clear()
+        cache.clear()
+        User = get_user_model()
+        self.admin = User.objects.create_superuser(
+            'admin@example.com', 'secret', first_name='Ada', last_name='Admin')
+        User.objects.create_user('jane@example.com', 'secret', first_name='Jane')
+        self.client.force_login(self.admin)
+
+    def test_search_by_name(self):
+        response = self.client.get(reverse('admin:siteuser_user_changelist'), {'q': 'jane'})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'jane@example.com')
+        self.assertNotContains(response, 'admin@example.com</a>')
+
+    def test_change_view(self):
+        response = self.client.get(
+            reverse('admin:siteuser_user_change', args=(self.admin.pk,)))
+        self.assertContains(response, 'Ada')
+
+    def test_deactivate_action(self):
+        User = get_user_model()
+        jane = User.objects.get(email='jane@example.com')
+        response = self.client.post(reverse('admin:siteuser_user_changelist'), {
+            'action': 'deactivate_users', '_selected_action': [jane.pk]}, follow=True)
+        self.assertContains(response, 'Updated 1 people on 1 site users.')
+        self.assertFalse(User.objects.get(pk=jane.pk).is_active)
+        self.assertTrue(User.objects.get(pk=self.admin.pk).is_active)
+
+    def test_export_action(self):
+        User = get_user_model()
+        response = self.client.post(reverse('admin:siteuser_user_changelist'), {
+            'action': 'export_csv',
+            '_selected_action': list(User.objects.values_list('pk', flat=True)),
+        })
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual(lines[0].split(',')[:2], ['auth0_id', 'email'])
+        self.assertEqual(len(lines), 3)
+        self.assertIn('jane@example.com', lines[2])
+
+
+@override_settings(
+    AUTH0_CLIENT='auth0user.clients.InMemoryClient', ALLOWED_HOSTS=['*'],
+    DATABASE_ROUTERS=['auth0user.routers.SiteShardRouter'], AUTH0_SITE_SHARDS={2: 'shard1'})
+class TestShardedSiteUserAdmin(TestCase):
+
+    multi_db = True
+
+    def setUp(self):
+        get_client().clear()
+        cache.clear()
+        # sites are the same on every shard
+        for alias in ('default', 'shard1'):
+            Site.objects.using(alias).get_or_create(
+                id=2, defaults={'domain': 'example.org', 'name': 'example.org'})
+        User = get_user_model()
+        self.admin = User.objects.create_superuser('admin@example.com', 'secret', site_id=2)
+        self.jane = User.objects.create_user('shard@example.com', 'secret', site_id=2)
+        # a user of the default site with the same primary key must not be exported
+        User.objects.create_user('other@example.com', 'secret', site_id=1)
+        self.client.force_login(self.admin)
+
+    def test_export_streams_from_site_shard(self):
+        response = self.client.post(reverse('admin:siteuser_user_changelist'), {
+            'action': 'export_csv', '_selected_action': [self.jane.pk]},
+            HTTP_HOST='example.org')
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn('shard@example.com', lines[1])
+
+
+@override_settings(AUTH0_CLIENT='auth0user.clients.InMemoryClient')
+class TestLastLogin(TestCase):
+
+    def setUp(self):
+        get_client().clear()
+        cache.clear()
+        self.user = get_user_model().objects.create_user('jane@example.com', 'secret')
+
+    @override_settings(AUTH0_LAST_LOGIN_INTERVAL=3600)
+    def test_last_login_throttled(self):
+        with mock.patch.object(Profile, 'save') as save:
+            self.client.force_login(self.user)
+            self.assertFalse(save.called)
+        last_login = get_user_model().objects.get(pk=self.user.pk).last_login
+        self.assertIsNotNone(last_login)
+        self.client.logout()
+        self.client.force_login(get_user_model().objects.get(pk=self.user.pk))
+        self.assertEqual(get_user_model().objects.get(pk=self.user.pk).last_login, last_login)
+
+    def test_names_only_written_when_changed(self):
+        manager = type(get_user_model()._default_manager)
+        with mock.patch.object(manager, 'sync_names') as sync_names:
+            self.client.force_login(self.user)
+        self.assertFalse(sync_names.called)
+        profile = Profile.get(self.user.auth0_id)
+        profile.given_name = 'Janet'
+        profile.save()
+        self.client.force_login(get_user_model().objects.get(pk=self.user.pk))
+        self.assertEqual(get_user_model().objects.get(pk=self.user.pk).given_name, 'Janet')